@@ -0,0 +1,242 @@
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import re
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from utils import consultas
+from utils.cache import cache_com_validade
+
+# --- API HTTP LOCAL, SOMENTE LEITURA, SOBRE OS DADOS DE VPA E P/VP ---
+# Uso: python api.py --porta 8000
+#   GET /vpa/HGLG11
+#   GET /pvp/HGLG11?anos=5
+#   GET /screener?pvp_min=0.8&pvp_max=1.0
+TAMANHO_MINIMO_GZIP = 1024
+MAX_AGE_SEGUNDOS = 300
+
+class ErroRequisicao(Exception):
+    """Erro que deve ser devolvido ao cliente com o status HTTP informado."""
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+def _ler_float(parametros, nome):
+    valor = parametros.get(nome, [None])[0]
+    if valor is None or valor == '':
+        return None
+    try:
+        numero = float(valor)
+    except ValueError:
+        raise ErroRequisicao(400, f"Parâmetro '{nome}' inválido: {valor}")
+    # float() aceita 'inf' e 'nan', que passariam por qualquer validação de faixa
+    if not math.isfinite(numero):
+        raise ErroRequisicao(400, f"Parâmetro '{nome}' inválido: {valor}")
+    return numero
+
+def _ler_int(parametros, nome):
+    valor = parametros.get(nome, [None])[0]
+    if valor is None or valor == '':
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise ErroRequisicao(400, f"Parâmetro '{nome}' deve ser um número inteiro: {valor}")
+
+def _etag_corresponde(if_none_match, etag):
+    """
+    Comparação fraca do If-None-Match (RFC 9110, seção 13.1.2): aceita uma lista de
+    validadores, o curinga '*' e a forma fraca W/"...", que proxies e navegadores devolvem.
+    """
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(',')]
+    if '*' in candidatos:
+        return True
+    sem_prefixo = lambda valor: valor[2:] if valor.startswith('W/') else valor
+    return sem_prefixo(etag) in {sem_prefixo(valor) for valor in candidatos}
+
+def _aceita_gzip(accept_encoding):
+    """
+    Indica se o Accept-Encoding admite gzip (RFC 9110, seção 12.5.3): 'gzip;q=0' é uma
+    recusa explícita, e o curinga '*' vale para o gzip quando ele não é citado.
+    """
+    qualidades = {}
+    for item in (accept_encoding or '').split(','):
+        codificacao, *parametros = [parte.strip() for parte in item.split(';')]
+        qualidade = 1.0
+        for parametro in parametros:
+            chave, _, valor = parametro.partition('=')
+            if chave.strip().lower() == 'q':
+                try:
+                    qualidade = float(valor)
+                except ValueError:
+                    qualidade = 0.0
+        if codificacao:
+            qualidades[codificacao.lower()] = qualidade
+    for codificacao in ('gzip', 'x-gzip', '*'):
+        if codificacao in qualidades:
+            return qualidades[codificacao] > 0
+    return False
+
+def _arredondar(valor):
+    # NaN não é JSON válido
+    return None if valor != valor else round(float(valor), 6)
+
+def montar_vpa(ticker):
+    cnpj = consultas.buscar_cnpj(ticker)
+    df_vpa = consultas.carregar_vpa_fundo(cnpj)
+    return {
+        'ticker': ticker.upper(),
+        'cnpj': cnpj,
+        'serie': [
+            {'data': data.strftime('%Y-%m-%d'), 'vpa': round(vpa, 6)}
+            for data, vpa in zip(df_vpa['data'], df_vpa['vpa'])
+        ],
+    }
+
+def montar_pvp(ticker, anos):
+    df_combinado = consultas.calcular_serie_pvp(ticker, anos)
+    return {
+        'ticker': ticker.upper(),
+        'anos': anos,
+        'media_pvp': round(float(df_combinado['P/VP'].mean()), 6),
+        'resolucao': df_combinado.attrs.get('resolucao', 'diaria'),
+        'serie': [
+            {'data': data.strftime('%Y-%m-%d'), 'preco_fechamento': round(preco, 6), 'vpa': round(vpa, 6), 'pvp': round(pvp, 6),
+             'media_movel': _arredondar(media), 'banda_inferior': _arredondar(inferior),
+             'banda_superior': _arredondar(superior), 'zscore': _arredondar(zscore), 'retorno_total': _arredondar(retorno_total)}
+            for data, preco, vpa, pvp, media, inferior, superior, zscore, retorno_total in zip(
+                df_combinado['data'], df_combinado['preco_fechamento'], df_combinado['vpa'], df_combinado['P/VP'],
+                df_combinado['media_movel'], df_combinado['banda_inferior'], df_combinado['banda_superior'], df_combinado['zscore'],
+                df_combinado['retorno_total']
+            )
+        ],
+    }
+
+def montar_screener(pvp_min, pvp_max):
+    df_screener = consultas.filtrar_fundos(pvp_min, pvp_max)
+    return {
+        'fundos': [
+            {'ticker': ticker, 'cnpj': cnpj, 'data_vpa': str(data_vpa)[:10], 'vpa': round(vpa, 6),
+             'preco_fechamento': round(preco, 6), 'pvp': round(pvp, 6),
+             'pvp_media_movel': _arredondar(media), 'pvp_zscore': _arredondar(zscore)}
+            for ticker, cnpj, data_vpa, vpa, preco, pvp, media, zscore in zip(
+                df_screener['ticker'], df_screener['cnpj'], df_screener['data_vpa'],
+                df_screener['vpa'], df_screener['preco_fechamento'], df_screener['P/VP'],
+                df_screener['media_movel'], df_screener['zscore']
+            )
+        ],
+    }
+
+@cache_com_validade(ttl_segundos=MAX_AGE_SEGUNDOS, max_itens=512)
+def gerar_resposta(rota, argumentos):
+    """
+    Serializa a resposta de uma rota e calcula seu ETag e sua versão compactada.
+    O resultado fica no mesmo cache da camada de consultas, evitando reserializar.
+    """
+    if rota == 'vpa':
+        conteudo = montar_vpa(*argumentos)
+    elif rota == 'pvp':
+        conteudo = montar_pvp(*argumentos)
+    else:
+        conteudo = montar_screener(*argumentos)
+    corpo = json.dumps(conteudo, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = '"' + hashlib.sha1(corpo).hexdigest() + '"'
+    corpo_gzip = gzip.compress(corpo, mtime=0) if len(corpo) >= TAMANHO_MINIMO_GZIP else None
+    return corpo, corpo_gzip, etag
+
+@consultas.ao_alterar_dados
+def _invalidar_respostas(tickers):
+    # O screener depende de todos os fundos; as demais rotas, só do ticker pedido
+    gerar_resposta.invalidar(lambda rota, argumentos: rota == 'screener' or argumentos[0] in tickers)
+
+def resolver_rota(caminho, parametros):
+    """
+    Traduz o caminho da URL em (rota, argumentos) para gerar_resposta.
+    """
+    correspondencia = re.fullmatch(r'/(vpa|pvp)/([A-Za-z0-9]+)/?', caminho)
+    if correspondencia:
+        rota, ticker = correspondencia.groups()
+        if rota == 'vpa':
+            return rota, (ticker.upper(),)
+        anos = _ler_int(parametros, 'anos')
+        anos = 5 if anos is None else anos
+        if not 1 <= anos <= 20:
+            raise ErroRequisicao(400, "O parâmetro 'anos' deve estar entre 1 e 20.")
+        return rota, (ticker.upper(), anos)
+    if caminho.rstrip('/') == '/screener':
+        return 'screener', (_ler_float(parametros, 'pvp_min'), _ler_float(parametros, 'pvp_max'))
+    raise ErroRequisicao(404, f"Rota não encontrada: {caminho}")
+
+class ManipuladorAPI(BaseHTTPRequestHandler):
+    server_version = 'AnaliseAportesAPI/1.0'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            rota, argumentos = resolver_rota(url.path, parse_qs(url.query))
+            consultas.verificar_versao_dados()
+            corpo, corpo_gzip, etag = gerar_resposta(rota, argumentos)
+        except ErroRequisicao as e:
+            return self._enviar_erro(e.status, str(e))
+        except (consultas.TickerNaoEncontrado, consultas.DadosInsuficientes) as e:
+            return self._enviar_erro(404, str(e))
+        except consultas.ErroConsulta as e:
+            return self._enviar_erro(502, str(e))
+        except Exception as e:
+            # Qualquer outra falha (banco, pandas, provedor) ainda responde ao cliente, em vez de derrubar a conexão
+            self.log_error("Erro interno em %s: %r", self.path, e)
+            traceback.print_exc()
+            return self._enviar_erro(500, "Erro interno ao processar a requisição.")
+
+        if _etag_corresponde(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', f'max-age={MAX_AGE_SEGUNDOS}')
+            self.end_headers()
+            return
+
+        usar_gzip = corpo_gzip is not None and _aceita_gzip(self.headers.get('Accept-Encoding'))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', f'max-age={MAX_AGE_SEGUNDOS}')
+        self.send_header('Vary', 'Accept-Encoding')
+        if usar_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        dados = corpo_gzip if usar_gzip else corpo
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _enviar_erro(self, status, mensagem):
+        corpo = json.dumps({'erro': mensagem}, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP local (somente leitura) com as séries de VPA e P/VP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8000)
+    args = parser.parse_args()
+
+    servidor = ThreadingHTTPServer((args.host, args.porta), ManipuladorAPI)
+    print(f"API disponível em http://{args.host}:{args.porta} (Ctrl+C para encerrar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ Esta aplicação foi desenvolvida para ajudar na visualização e análise de se
 
 - **Análise de Aportes:** Faça o upload da sua planilha de negociações da B3 para visualizar suas compras em um gráfico de cotações.
 - **Análise P/VP Histórico:** Explore o histórico do indicador Preço / Valor Patrimonial para qualquer FII.
+- **Explorar:** Compare o P/VP e a evolução do VPA entre os segmentos de FIIs ao longo do tempo.
 
 ---
 """)
@@ -1,11 +1,11 @@
 import streamlit as st
-import pandas as pd
-import yfinance as yf
-import matplotlib.pyplot as plt
 from datetime import timedelta
+from utils import consultas
 
 # --- FUNÇÃO DE PLOTAGEM (AJUSTADA E ROBUSTA) ---
 def plotar_grafico_aportes(ticker, df_aportes_filtrado, fig, ax, janela_dias=365):
+    import pandas as pd
+
     try:
         coluna_data = 'Data do Negócio'
         coluna_quantidade = 'Quantidade'
@@ -18,19 +18,26 @@ def plotar_grafico_aportes(ticker, df_aportes_filtrado, fig, ax, janela_dias=365
     ticker_sa = f"{ticker.upper()}.SA"
     inicio = min(datas_compra) - timedelta(days=janela_dias + 5)
     fim = max(datas_compra) + timedelta(days=janela_dias + 5)
-    df_cotacoes = yf.download(ticker_sa, start=inicio.strftime("%Y-%m-%d"), end=fim.strftime("%Y-%m-%d"), progress=False)
-
-    if df_cotacoes.empty:
-        st.warning(f"Não foram encontrados dados de cotação para '{ticker_sa}' no Yahoo Finance.")
+    try:
+        # Mesmo provedor e mesmo cache da página de P/VP
+        df_precos = consultas.baixar_precos(ticker.upper(), inicio.date(), fim.date())
+    except consultas.ErroConsulta:
+        st.warning(f"Não foram encontrados dados de cotação para '{ticker_sa}'.")
         return
-
-    ax.plot(df_cotacoes.index, df_cotacoes['Close'], label=f'Cotação ({ticker_sa})', color='royalblue', linewidth=2, zorder=1)
+    cotacoes = df_precos.set_index('data')['preco_fechamento']
+
+    ax.plot(cotacoes.index, cotacoes, label=f'Cotação ({ticker_sa})', color='royalblue', linewidth=2, zorder=1)
+    # Para fundos que distribuem muito, a cotação sozinha subestima o resultado de cada compra
+    retorno_total = consultas.calcular_retorno_total(df_precos, ticker)
+    if retorno_total.notna().any():
+        ax.plot(cotacoes.index, retorno_total.to_numpy(), label='Retorno Total (proventos reinvestidos)',
+                color='seagreen', linestyle='--', linewidth=1.5, zorder=2)
     
     fator_tamanho = 5
     for data, quantidade in zip(datas_compra, quantidades_compra):
         try:
-            data_ajustada = df_cotacoes.index.asof(data)
-            preco_no_dia = df_cotacoes.loc[data_ajustada]['Close']
+            data_ajustada = cotacoes.index.asof(data)
+            preco_no_dia = cotacoes.loc[data_ajustada]
             ax.scatter(data_ajustada, preco_no_dia, s=quantidade * fator_tamanho, color='red', edgecolor='black', alpha=0.7, zorder=5)
         except (KeyError, IndexError, TypeError):
             pass
@@ -52,45 +59,51 @@ def plotar_grafico_aportes(ticker, df_aportes_filtrado, fig, ax, janela_dias=365
 if 'pagina_aportes' not in st.session_state:
     st.session_state.pagina_aportes = 'upload'
 
-def carregar_e_validar():
-    arquivo_carregado = st.session_state.get('uploader_aportes', None)
-    if arquivo_carregado:
-        if 'movimentacao' in arquivo_carregado.name.lower():
-            st.error("❌ **Arquivo Incorreto!** Você carregou a planilha de **movimentações**. Por favor, acesse a aba **Negociação** no portal da B3.")
-            return
-        try:
-            with st.spinner('Carregando e validando sua planilha...'):
-                df = pd.read_excel(arquivo_carregado)
-                coluna_movimentacao = 'Tipo de Movimentação'
-                coluna_ticker = 'Código de Negociação'
-                coluna_preco = 'Preço'
-                
-                if coluna_movimentacao not in df.columns:
-                    st.error(f"A coluna '{coluna_movimentacao}' não foi encontrada. Verifique se a planilha é a de 'Negociação' da B3.")
-                    return
-                
-                df_compras = df[df[coluna_movimentacao] == 'Compra'].copy()
-                if df_compras.empty:
-                    st.warning("A planilha carregada não contém nenhuma operação de 'Compra'.")
-                    return
-                
-                df_compras[coluna_preco] = pd.to_numeric(df_compras[coluna_preco].astype(str).str.replace('R$', '', regex=False).str.strip().str.replace(',', '.', regex=False), errors='coerce')
-                df_compras.dropna(subset=[coluna_preco], inplace=True)
-                
-                df_compras[coluna_ticker] = df_compras[coluna_ticker].astype(str).str.strip().str.upper().str.replace('F$', '', regex=True)
-                df_compras[coluna_ticker] = df_compras[coluna_ticker].str.replace('TRPL4', 'ISAE4', regex=True)
-                df_compras[coluna_ticker] = df_compras[coluna_ticker].str.replace('TRPL3', 'ISAE3', regex=True)
-                
-                st.session_state.df_negociacoes = df_compras
-                st.session_state.pagina_aportes = 'analise'
-        except Exception as e:
-            st.error(f"Não foi possível processar a planilha. Verifique o arquivo. Erro: {e}")
-    else:
-        st.warning("Por favor, carregue um arquivo para continuar.")
+def carregar_e_validar(chave_uploader='uploader_aportes'):
+    """
+    Lê as planilhas enviadas e as incorpora às compras já carregadas na sessão.
+    Planilhas já lidas (identificadas pelo hash do conteúdo) não são lidas de novo,
+    e as novas são lidas em paralelo.
+    """
+    arquivos_carregados = st.session_state.get(chave_uploader) or []
+    if not arquivos_carregados:
+        st.warning("Por favor, carregue ao menos um arquivo para continuar.")
+        return
+
+    from utils import negociacoes
+    planilhas_carregadas = st.session_state.setdefault('planilhas_carregadas', {})
+    conteudos, nomes = {}, {}
+    for arquivo in arquivos_carregados:
+        if 'movimentacao' in arquivo.name.lower():
+            st.error(f"❌ **Arquivo Incorreto!** '{arquivo.name}' é a planilha de **movimentações**. Por favor, acesse a aba **Negociação** no portal da B3.")
+            continue
+        conteudo = arquivo.getvalue()
+        chave = negociacoes.calcular_hash(conteudo)
+        if chave not in planilhas_carregadas:
+            conteudos[chave] = conteudo
+            nomes[chave] = arquivo.name
+
+    with st.spinner('Carregando e validando suas planilhas...'):
+        resultados = negociacoes.ler_planilhas(conteudos)
+
+    df_negociacoes = st.session_state.get('df_negociacoes')
+    for chave, resultado in resultados.items():
+        if isinstance(resultado, negociacoes.PlanilhaSemCompras):
+            st.warning(f"{nomes[chave]}: {resultado}")
+            continue
+        if isinstance(resultado, negociacoes.ErroPlanilha):
+            st.error(f"{nomes[chave]}: {resultado}")
+            continue
+        df_negociacoes = negociacoes.mesclar_negociacoes(df_negociacoes, resultado)
+        planilhas_carregadas[chave] = nomes[chave]
+
+    if df_negociacoes is not None:
+        st.session_state.df_negociacoes = df_negociacoes
+        st.session_state.pagina_aportes = 'analise'
 
 def voltar_para_upload():
     # Limpa os dados da sessão ao voltar
-    for key in ['df_negociacoes', 'pagina_aportes', 'uploader_aportes']:
+    for key in ['df_negociacoes', 'planilhas_carregadas', 'pagina_aportes', 'uploader_aportes', 'uploader_adicionais']:
         if key in st.session_state:
             del st.session_state[key]
     st.session_state.pagina_aportes = 'upload'
@@ -102,7 +115,7 @@ st.title("📊 Análise de Aportes")
 # ETAPA 1: UPLOAD
 if st.session_state.pagina_aportes == 'upload':
     st.header('Passo 1: Carregue sua Planilha de Negociação')
-    st.markdown("Use o arquivo **.xlsx** de **negociações** obtido no Portal do Investidor da B3.")
+    st.markdown("Use o arquivo **.xlsx** de **negociações** obtido no Portal do Investidor da B3. Se o seu histórico for maior que o período máximo de exportação, envie várias planilhas: as negociações repetidas entre elas são descartadas.")
 
     # Inserido o passo a passo que você queria
     with st.expander("Precisa de ajuda para obter o arquivo? Clique aqui."):
@@ -114,19 +127,29 @@ if st.session_state.pagina_aportes == 'upload':
         """)
 
     st.file_uploader(
-        "**Arraste o arquivo da B3 para cá ou clique para procurar**",
+        "**Arraste os arquivos da B3 para cá ou clique para procurar**",
         type=['xlsx'],
+        accept_multiple_files=True,
         key='uploader_aportes',
         label_visibility='visible'
     )
     st.button('Analisar Planilha', on_click=carregar_e_validar, type="primary")
 
+    # Enquanto o usuário escolhe o arquivo, o pandas (e o openpyxl, usado pelo read_excel) já vão sendo importados
+    consultas.aquecer_em_segundo_plano(('pandas', 'openpyxl', 'yfinance'))
+
 # ETAPA 2: ANÁLISE
 elif st.session_state.pagina_aportes == 'analise':
     st.header('Passo 2: Escolha o Ativo para Análise')
     df_completo = st.session_state.df_negociacoes
     coluna_ticker = 'Código de Negociação'
 
+    planilhas_carregadas = st.session_state.get('planilhas_carregadas', {})
+    st.caption(f"{len(df_completo)} compras carregadas de {len(planilhas_carregadas)} planilha(s): {', '.join(planilhas_carregadas.values())}")
+    with st.expander("Adicionar mais planilhas"):
+        st.file_uploader("Planilhas de outros períodos", type=['xlsx'], accept_multiple_files=True, key='uploader_adicionais')
+        st.button('Adicionar ao Histórico', on_click=carregar_e_validar, args=('uploader_adicionais',))
+
     try:
         # Lógica de ordenação dos tickers reintroduzida
         tickers_unicos = df_completo[coluna_ticker].unique().tolist()
@@ -150,11 +173,51 @@ elif st.session_state.pagina_aportes == 'analise':
             with st.spinner(f'Buscando dados de {ticker_selecionado} e gerando o gráfico...'):
                 filtro_ticker = df_completo[coluna_ticker] == ticker_selecionado
                 df_filtrado = df_completo[filtro_ticker]
+                import matplotlib.pyplot as plt
                 fig, ax = plt.subplots(figsize=(15, 8))
                 plt.style.use('seaborn-v0_8-darkgrid')
                 plotar_grafico_aportes(ticker_selecionado, df_filtrado, fig, ax, janela_input)
                 st.pyplot(fig)
+
+                # Resultado de cada compra até hoje, com e sem os proventos
+                from utils import avaliacao
+                try:
+                    df_retornos = avaliacao.calcular_retorno_das_compras(df_filtrado, ticker_selecionado)
+                except consultas.ErroConsulta as e:
+                    st.warning(f"Não foi possível calcular o retorno das compras. {e}")
+                else:
+                    st.dataframe(
+                        df_retornos.rename(columns={
+                            'data': 'Data da compra', 'quantidade': 'Cotas', 'preco': 'Preço pago (R$)',
+                            'retorno_preco': 'Retorno do preço', 'retorno_total': 'Retorno total'
+                        }).style.format({'Preço pago (R$)': '{:.2f}', 'Retorno do preço': '{:+.1%}', 'Retorno total': '{:+.1%}',
+                                         'Data da compra': '{:%d/%m/%Y}'}, na_rep='-'),
+                        hide_index=True, use_container_width=True
+                    )
         else:
             st.warning('Por favor, selecione um ativo da lista.')
+
+    # P/VP pago em todas as compras de FIIs, calculado de uma vez para a planilha inteira
+    st.divider()
+    st.subheader('P/VP Pago nas Compras de FIIs')
+    from utils import avaliacao
+    consultas.verificar_versao_dados()
+    try:
+        df_avaliado = avaliacao.calcular_pvp_nas_compras(df_completo)
+        df_por_fundo, pvp_carteira = avaliacao.resumir_pvp_pago(df_avaliado)
+    except Exception as e:
+        st.error(f"Não foi possível calcular o P/VP das compras. Erro: {e}")
+    else:
+        if pvp_carteira is None:
+            st.info("Nenhuma compra de FII com VPA disponível foi encontrada na planilha.")
+        else:
+            st.metric('P/VP médio pago na carteira (ponderado pelo valor investido)', f"{pvp_carteira:.2f}")
+            st.dataframe(
+                df_por_fundo.rename(columns={
+                    'ticker': 'Fundo', 'quantidade': 'Cotas compradas',
+                    'valor_investido': 'Valor investido (R$)', 'pvp_medio_pago': 'P/VP médio pago'
+                }),
+                hide_index=True, use_container_width=True
+            )
             
     st.button('Carregar Outra Planilha', on_click=voltar_para_upload)
\ No newline at end of file
@@ -0,0 +1,66 @@
+import streamlit as st
+from datetime import date
+from utils import analitico, consultas
+
+# --- Interface da Página ---
+st.set_page_config(page_title="Explorar FIIs", page_icon="🔎", layout="wide")
+st.title("🔎 Explorar FIIs por Segmento")
+st.markdown("Compare o P/VP e a evolução do VPA entre os segmentos de Fundos Imobiliários ao longo do tempo.")
+# Se o pipeline publicou dados novos, descarta do cache só o que mudou
+consultas.verificar_versao_dados()
+
+MEDIDAS = {
+    # medida: (título do gráfico, eixo y, formato d3)
+    'P/VP': ('P/VP por segmento', 'P/VP', '.2f'),
+    'Variação do VPA': ('Variação do VPA em relação ao período anterior, por segmento', 'Variação do VPA', '.1%'),
+}
+
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    medida = st.selectbox('Medida:', list(MEDIDAS))
+with col2:
+    periodo = st.selectbox('Agrupar por:', list(analitico.PERIODOS))
+with col3:
+    estatistica = st.selectbox('Estatística entre os fundos:', list(analitico.ESTATISTICAS))
+with col4:
+    janela_anos = st.number_input('Últimos (anos):', min_value=1, max_value=20, step=1, value=5)
+
+if st.button('Consultar', type="primary"):
+    import time
+    import pandas as pd
+    from utils import graficos
+    data_inicial = (pd.Timestamp(date.today()) - pd.DateOffset(years=janela_anos)).date()
+    # Janelas longas usam a série mensal, como na página de P/VP
+    resolucao = 'semanal' if janela_anos <= consultas.LIMITE_ANOS_SEMANAL else 'mensal'
+    inicio = time.perf_counter()
+    with st.spinner('Consultando o histórico de todos os fundos...'):
+        try:
+            if medida == 'P/VP':
+                df_agregado = analitico.pvp_por_segmento(resolucao, periodo, estatistica, data_inicial)
+            else:
+                df_agregado = analitico.variacao_vpa_por_segmento(periodo, estatistica, data_inicial)
+        except consultas.ErroConsulta as e:
+            st.warning(str(e))
+            st.stop()
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+
+    if df_agregado.empty:
+        st.info("Nenhum dado encontrado para a janela escolhida.")
+        st.stop()
+    motor = 'DuckDB' if analitico.duckdb_disponivel() else 'pandas (instale o duckdb para consultas mais rápidas)'
+    st.caption(f"{len(df_agregado)} combinações de segmento e período em {duracao_ms:.0f} ms · {motor}")
+
+    titulo, eixo_y, formato = MEDIDAS[medida]
+    st.plotly_chart(graficos.montar_figura_segmentos(df_agregado, f'{titulo} ({estatistica.lower()})', eixo_y, formato),
+                    use_container_width=True)
+
+    st.subheader("Tabela")
+    df_tabela = df_agregado.pivot(index='periodo', columns='segmento', values='valor').sort_index(ascending=False)
+    df_tabela.index = df_tabela.index.strftime('%m/%Y' if periodo != 'Ano' else '%Y')
+    st.dataframe(df_tabela.style.format('{:.2f}' if medida == 'P/VP' else '{:+.2%}', na_rep='-'), use_container_width=True)
+
+with st.expander("Como os segmentos são definidos?"):
+    st.markdown(
+        "O segmento de cada fundo é o declarado no informe mensal mais recente enviado à CVM. "
+        "Fundos sem essa informação são classificados pelo nome (ex.: *Logística*, *Recebíveis*, *Shopping*)."
+    )
@@ -0,0 +1,264 @@
+import argparse
+import os
+import sqlite3
+import sys
+import pandas as pd
+
+# O motor de estatísticas é compartilhado com o app, que fica na raiz do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.estatisticas import COLUNAS_ESTATISTICAS, calcular_estatisticas_moveis, atualizar_estatisticas, janela_em_pontos
+from utils.versao_dados import calcular_hashes_por_grupo, registrar_versao
+from utils import particoes, provedores
+
+# --- CONFIGURAÇÃO ---
+NOME_BANCO = 'database/dados_fii.db'
+ANOS_HISTORICO = 20
+DIAS_REPROCESSAMENTO = 120  # Cobre a defasagem com que a CVM publica o VPA de cada mês
+RESOLUCOES = {
+    # tabela: (frequência do período usada no agrupamento, resolução das estatísticas)
+    'pvp_semanal': ('W-FRI', 'semanal'),
+    'pvp_mensal': ('M', 'mensal'),
+}
+TABELA_PROVENTOS = 'proventos'
+
+def baixar_fechamentos(tickers, data_inicial, pasta_espelho=None):
+    """
+    Baixa os fechamentos diários de todos os tickers pelo provedor de cotações configurado
+    (utils/provedores.py, que divide o pedido em lotes paralelos) e retorna em formato longo
+    (colunas 'ticker', 'data', 'preco_fechamento').
+    Com pasta_espelho, os fechamentos baixados também atualizam o espelho local em arquivos,
+    que o app usa quando o Yahoo Finance está fora do ar (ou sempre, com PROVEDOR_PRECOS=arquivos).
+    """
+    provedor = provedores.obter_provedor()
+    print(f"Baixando preços de {len(tickers)} tickers (provedor '{provedor.nome}')...")
+    try:
+        df_fechamentos = provedor.baixar_fechamentos(tickers, data_inicial)
+    except provedores.ErroProvedor as e:
+        print(f"  -> Erro ao baixar os preços: {e}")
+        return pd.DataFrame(columns=['ticker', 'data', 'preco_fechamento'])
+    if pasta_espelho:
+        provedores.ProvedorArquivos(pasta_espelho).gravar(df_fechamentos)
+        print(f"  -> Espelho local em '{pasta_espelho}' atualizado ({df_fechamentos.shape[1]} tickers).")
+    df_longo = df_fechamentos.stack().rename('preco_fechamento').reset_index()
+    return df_longo[['ticker', 'data', 'preco_fechamento']].dropna(subset=['preco_fechamento'])
+
+def baixar_proventos(tickers, data_inicial, pasta_espelho=None):
+    """
+    Baixa os proventos por cota (na data-ex) de todos os tickers pelo provedor de cotações
+    e retorna em formato longo (colunas 'ticker', 'data', 'provento').
+    Retorna None se o provedor falhar: as séries seguem, sem os proventos novos.
+    Os tickers efetivamente obtidos (inclusive os sem provento no período) ficam em
+    df.attrs['tickers']: os de lotes que falharam não devem perder os proventos já gravados.
+    """
+    provedor = provedores.obter_provedor()
+    print(f"Baixando proventos de {len(tickers)} tickers (provedor '{provedor.nome}')...")
+    try:
+        df_proventos = provedor.baixar_proventos(tickers, data_inicial)
+    except provedores.ErroProvedor as e:
+        print(f"  -> Erro ao baixar os proventos: {e}")
+        return None
+    if pasta_espelho:
+        provedores.ProvedorArquivos(pasta_espelho).gravar(df_proventos, 'proventos')
+    df_longo = df_proventos.stack().rename('provento').reset_index()
+    df_longo = df_longo[['ticker', 'data', 'provento']].dropna(subset=['provento'])
+    df_longo.attrs['tickers'] = set(df_proventos.columns)
+    return df_longo
+
+def calcular_fatores_proventos(df_proventos, df_precos, df_existente=None, corte=None):
+    """
+    Monta a tabela de proventos com o fator de reinvestimento acumulado de cada ticker.
+    Cada provento vale 1 + provento / fechamento da data-ex; o produto acumulado desses
+    fatores, multiplicado pelo preço, é a série de retorno total (proventos reinvestidos).
+    Da tabela já gravada vêm os proventos anteriores ao corte (execução diária) e todos os
+    dos tickers que não foram baixados agora, por falha do provedor ou falta de cotações.
+    """
+    df_novos = pd.merge_asof(
+        df_proventos.sort_values('data'), df_precos[['ticker', 'data', 'preco_fechamento']].sort_values('data'),
+        on='data', by='ticker', direction='backward'
+    ).dropna(subset=['preco_fechamento'])
+    if df_existente is not None and not df_existente.empty:
+        baixados = df_proventos.attrs.get('tickers', set(df_proventos['ticker'])) & set(df_precos['ticker'])
+        manter = ~df_existente['ticker'].isin(baixados)
+        if corte is not None:
+            manter |= df_existente['data'] < corte
+        df_novos = pd.concat([df_existente[manter], df_novos], ignore_index=True)
+    df_tabela = df_novos[['ticker', 'data', 'provento', 'preco_fechamento']].sort_values(['ticker', 'data'], ignore_index=True)
+    df_tabela['fator_acumulado'] = (1 + df_tabela['provento'] / df_tabela['preco_fechamento']).groupby(df_tabela['ticker']).cumprod()
+    return df_tabela
+
+def combinar_com_vpa(df_precos, df_vpa, df_cadastro):
+    """
+    Associa a cada preço diário o VPA mais recente do fundo, num único merge_asof agrupado por CNPJ.
+    """
+    df_precos = df_precos.merge(df_cadastro[['ticker', 'cnpj']], on='ticker')
+    df_combinado = pd.merge_asof(
+        df_precos.sort_values('data'), df_vpa.sort_values('data'),
+        on='data', by='cnpj', direction='backward'
+    )
+    # VPA nulo ou não positivo não gera P/VP com significado (e contaminaria as somas móveis)
+    df_combinado = df_combinado[df_combinado['vpa'] > 0].copy()
+    df_combinado['pvp'] = df_combinado['preco_fechamento'] / df_combinado['vpa']
+    return df_combinado
+
+def adicionar_fator_proventos(df_combinado, df_fatores):
+    """
+    Associa a cada preço diário o fator de proventos acumulado até aquela data (1 antes do primeiro provento).
+    """
+    df_combinado = pd.merge_asof(
+        df_combinado.sort_values('data'),
+        df_fatores[['ticker', 'data', 'fator_acumulado']].astype({'data': df_combinado['data'].dtype})
+        .sort_values('data').rename(columns={'fator_acumulado': 'fator_proventos'}),
+        on='data', by='ticker', direction='backward'
+    )
+    df_combinado['fator_proventos'] = df_combinado['fator_proventos'].fillna(1.0)
+    return df_combinado
+
+def reamostrar(df_combinado, frequencia):
+    """
+    Mantém o último pregão de cada período (semana ou mês) por ticker.
+    A coluna 'data' passa a ser a data desse último pregão.
+    """
+    df_ordenado = df_combinado.sort_values(['ticker', 'data'])
+    periodo = df_ordenado['data'].dt.to_period(frequencia).rename('periodo')
+    df_reamostrado = df_ordenado.groupby([df_ordenado['ticker'], periodo], sort=False).last()
+    df_reamostrado = df_reamostrado.reset_index(level='ticker').reset_index(drop=True)
+    return df_reamostrado[['ticker', 'data', 'preco_fechamento', 'vpa', 'pvp', 'fator_proventos']]
+
+def ler_tabela_existente(conn, nome_tabela):
+    """
+    Lê uma tabela agregada já materializada. Retorna None se ela não existir
+    ou se for de uma versão anterior, sem as colunas de estatísticas ou de proventos.
+    """
+    try:
+        df_existente = particoes.ler_tabela(nome_tabela, conn)
+    except pd.errors.DatabaseError:
+        return None
+    if not set(COLUNAS_ESTATISTICAS + ['fator_proventos']).issubset(df_existente.columns):
+        return None
+    df_existente['data'] = pd.to_datetime(df_existente['data'])
+    return df_existente
+
+def criar_tabelas_pvp_agregadas(completo=False, armazenamento='particionado', pasta_espelho=None):
+    """
+    Gera as representações semanal e mensal de preço, VPA e P/VP de todos os FIIs cadastrados,
+    com as estatísticas móveis do P/VP, usadas pelas visões de horizonte longo da página de P/VP.
+    Na execução diária só a cauda recente é baixada e recalculada; com completo=True
+    (ou se as tabelas ainda não existirem) todo o histórico é refeito.
+    Com armazenamento='particionado', as tabelas vão para partições anuais em
+    database/particoes, e só a do ano corrente muda na execução diária.
+    Os proventos de cada fundo são gravados na tabela 'proventos', com o fator de
+    reinvestimento acumulado, e as séries agregadas levam esse fator ('fator_proventos'),
+    de modo que o app monta o retorno total sem recalcular a cadeia de reinvestimentos.
+    """
+    try:
+        conn = sqlite3.connect(NOME_BANCO)
+        df_cadastro = pd.read_sql_query("SELECT ticker, cnpj FROM cadastro_fiis", conn)
+        df_vpa = particoes.ler_tabela('vpa_historico', conn)[['cnpj', 'data_comptc', 'vpa']].rename(columns={'data_comptc': 'data'})
+        existentes = {nome_tabela: ler_tabela_existente(conn, nome_tabela) for nome_tabela in RESOLUCOES}
+        try:
+            df_proventos_existente = particoes.ler_tabela(TABELA_PROVENTOS, conn)
+            df_proventos_existente['data'] = pd.to_datetime(df_proventos_existente['data'])
+        except pd.errors.DatabaseError:
+            df_proventos_existente = None
+        conn.close()
+    except Exception as e:
+        print(f"Erro ao ler o banco de dados '{NOME_BANCO}': {e}")
+        return None
+    df_vpa['data'] = pd.to_datetime(df_vpa['data'])
+
+    # Sem proventos gravados, a cadeia de fatores precisa ser montada desde o início do histórico
+    completo = completo or df_proventos_existente is None or df_proventos_existente.empty or any(df is None or df.empty for df in existentes.values())
+    if completo:
+        print("Gerando as séries agregadas a partir de todo o histórico...")
+        data_inicial = pd.Timestamp.now().normalize() - pd.DateOffset(years=ANOS_HISTORICO)
+    else:
+        ultima_data = min(df['data'].max() for df in existentes.values())
+        data_inicial = ultima_data - pd.Timedelta(days=DIAS_REPROCESSAMENTO)
+        print(f"Atualizando as séries agregadas a partir de {data_inicial:%d/%m/%Y}...")
+
+    # Cada tabela é recalculada a partir do início do período que contém a data inicial,
+    # para que nenhum período fique com apenas parte dos seus pregões
+    cortes = {nome_tabela: pd.Period(data_inicial, frequencia).start_time for nome_tabela, (frequencia, _) in RESOLUCOES.items()}
+    inicio_download = min(cortes.values())
+
+    tickers = sorted(df_cadastro['ticker'].unique())
+    df_precos = baixar_fechamentos(tickers, inicio_download.strftime('%Y-%m-%d'), pasta_espelho)
+    if df_precos.empty:
+        print("Pipeline interrompido: nenhum preço foi baixado.")
+        return None
+
+    df_proventos = baixar_proventos(tickers, inicio_download.strftime('%Y-%m-%d'), pasta_espelho)
+    if df_proventos is not None:
+        df_fatores = calcular_fatores_proventos(df_proventos, df_precos, df_proventos_existente, None if completo else inicio_download)
+    elif df_proventos_existente is not None:
+        df_fatores = df_proventos_existente
+    else:
+        df_fatores = pd.DataFrame({'ticker': pd.Series(dtype=str), 'data': pd.Series(dtype='datetime64[ns]'),
+                                   'provento': pd.Series(dtype=float), 'preco_fechamento': pd.Series(dtype=float),
+                                   'fator_acumulado': pd.Series(dtype=float)})
+    print(f"Proventos: {len(df_fatores)} registros de {df_fatores['ticker'].nunique()} tickers.")
+
+    df_combinado = adicionar_fator_proventos(combinar_com_vpa(df_precos, df_vpa, df_cadastro), df_fatores)
+    try:
+        conn = sqlite3.connect(NOME_BANCO)
+        tabelas_gravadas = []
+        for nome_tabela, (frequencia, resolucao) in RESOLUCOES.items():
+            janela = janela_em_pontos(resolucao)
+            df_reamostrado = reamostrar(df_combinado, frequencia)
+            if completo:
+                df_reamostrado[COLUNAS_ESTATISTICAS] = calcular_estatisticas_moveis(df_reamostrado, janela, 'pvp', 'ticker')
+                df_tabela = df_reamostrado
+            else:
+                corte = cortes[nome_tabela]
+                df_historico = existentes[nome_tabela]
+                df_historico = df_historico[df_historico['data'] < corte]
+                df_reamostrado = atualizar_estatisticas(df_historico, df_reamostrado[df_reamostrado['data'] >= corte], janela)
+                df_tabela = pd.concat([df_historico, df_reamostrado], ignore_index=True)
+
+            if armazenamento == 'particionado':
+                particoes.gravar_tabela(df_tabela, nome_tabela)
+                conn.execute(f"DROP TABLE IF EXISTS {nome_tabela}")
+            elif completo:
+                df_tabela.to_sql(nome_tabela, conn, if_exists='replace', index=False)
+            else:
+                conn.execute(f"DELETE FROM {nome_tabela} WHERE data >= ?", (corte.strftime('%Y-%m-%d'),))
+                df_reamostrado.to_sql(nome_tabela, conn, if_exists='append', index=False)
+            if armazenamento == 'sqlite':
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{nome_tabela}_ticker_data ON {nome_tabela} (ticker, data)")
+            tabelas_gravadas.append(df_tabela.assign(tabela=nome_tabela))
+            print(f"Tabela '{nome_tabela}': {len(df_reamostrado)} registros gravados.")
+        if df_proventos is None and df_proventos_existente is None:
+            # Uma tabela vazia seria tomada como completa na próxima execução, que então
+            # baixaria só a cauda recente e perderia os proventos antigos
+            print("Tabela de proventos não gravada: o provedor falhou e ainda não há proventos gravados.")
+        elif armazenamento == 'particionado':
+            particoes.gravar_tabela(df_fatores, TABELA_PROVENTOS)
+            conn.execute(f"DROP TABLE IF EXISTS {TABELA_PROVENTOS}")
+        else:
+            df_fatores.to_sql(TABELA_PROVENTOS, conn, if_exists='replace', index=False)
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABELA_PROVENTOS}_ticker_data ON {TABELA_PROVENTOS} (ticker, data)")
+        tabelas_gravadas.append(df_fatores.assign(tabela=TABELA_PROVENTOS))
+        # O hash cobre o conteúdo final das tabelas, para que o app invalide só os tickers alterados
+        df_gravado = pd.concat(tabelas_gravadas, ignore_index=True)
+        registrar_versao(conn, 'precos', calcular_hashes_por_grupo(
+            df_gravado, 'ticker', ['tabela', 'data', 'preco_fechamento', 'vpa', 'pvp', 'fator_proventos', 'provento', 'fator_acumulado']
+        ))
+        conn.commit()
+        conn.execute("VACUUM")
+        conn.close()
+    except Exception as e:
+        print(f"Erro ao salvar os dados no banco SQLite: {e}")
+        return None
+    return df_combinado
+
+# --- Ponto de partida para executar o script ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera as séries semanais e mensais de P/VP com estatísticas móveis.")
+    parser.add_argument('--completo', action='store_true', help="Refaz todo o histórico em vez de só a cauda recente.")
+    parser.add_argument('--armazenamento', choices=['particionado', 'sqlite'], default='particionado',
+                        help="Partições anuais compactadas (padrão) ou tabelas dentro do arquivo .db.")
+    parser.add_argument('--espelho', nargs='?', const=provedores.PASTA_ESPELHO_PADRAO, default=None, metavar='PASTA',
+                        help="Também grava os fechamentos baixados no espelho local de cotações.")
+    args = parser.parse_args()
+    if criar_tabelas_pvp_agregadas(completo=args.completo, armazenamento=args.armazenamento, pasta_espelho=args.espelho) is None:
+        sys.exit(1)
@@ -1,3 +1,4 @@
+import argparse
 import requests
 import zipfile
 import io
@@ -5,7 +6,45 @@ import pandas as pd
 import re
 import sqlite3
 import os
+import sys
+import json
+import time
+import random
+from datetime import date
 from bs4 import BeautifulSoup
+from valida_dados_vpa import validar_vpa
+
+# O registro de versão dos dados é compartilhado com o app, que fica na raiz do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.versao_dados import calcular_hashes_por_grupo, registrar_versao
+from utils import particoes
+
+# --- CONFIGURAÇÃO DE RESILIÊNCIA DO PIPELINE ---
+PASTA_CHECKPOINTS = 'database/checkpoints'
+ARQUIVO_MANIFESTO = os.path.join(PASTA_CHECKPOINTS, 'manifesto.json')
+MAX_TENTATIVAS = 5
+ESPERA_BASE_SEGUNDOS = 2.0
+ESPERA_MAXIMA_SEGUNDOS = 60.0
+COLUNAS_SEGMENTOS = ['cnpj', 'data_comptc', 'segmento']
+
+def requisitar_com_retentativas(url, metodo='GET', timeout=60):
+    """
+    Faz a requisição HTTP repetindo em caso de falha, com backoff exponencial e jitter.
+    Levanta a última exceção se todas as tentativas falharem.
+    """
+    for tentativa in range(1, MAX_TENTATIVAS + 1):
+        try:
+            response = requests.request(metodo, url, timeout=timeout)
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            if tentativa == MAX_TENTATIVAS:
+                raise
+            # "Full jitter": espera aleatória entre 0 e o teto exponencial da tentativa
+            teto = min(ESPERA_MAXIMA_SEGUNDOS, ESPERA_BASE_SEGUNDOS * 2 ** (tentativa - 1))
+            espera = random.uniform(0, teto)
+            print(f"  -> Tentativa {tentativa}/{MAX_TENTATIVAS} falhou ({e}). Nova tentativa em {espera:.1f}s...")
+            time.sleep(espera)
 
 def encontrar_urls_disponiveis():
     """
@@ -16,8 +55,7 @@ def encontrar_urls_disponiveis():
     url_base = 'https://dados.cvm.gov.br/dados/FII/DOC/INF_MENSAL/DADOS/'
     urls = []
     try:
-        response = requests.get(url_base)
-        response.raise_for_status()
+        response = requisitar_com_retentativas(url_base)
         soup = BeautifulSoup(response.text, 'html.parser')
         
         # Padrão de regex que captura "..._2020.zip" e também "..._202101.zip"
@@ -38,12 +76,13 @@ def processar_um_arquivo_cvm(url):
     """
     Baixa e processa um único arquivo .zip da CVM, vindo de uma URL completa,
     e padroniza as colunas usando um mapa de sinônimos.
+    Retorna None em caso de falha e, em caso de sucesso, o DataFrame dos informes
+    (possivelmente vazio) e o dos segmentos de atuação lidos do mesmo zip (extrair_segmentos).
     """
     nome_do_arquivo_zip = url.split('/')[-1]
     print(f"\n--- Processando arquivo: {nome_do_arquivo_zip} ---")
     try:
-        response = requests.get(url, timeout=60)
-        response.raise_for_status()
+        response = requisitar_com_retentativas(url)
     except requests.exceptions.RequestException as e:
         print(f"  -> Erro no download do arquivo: {e}")
         return None
@@ -79,26 +118,182 @@ def processar_um_arquivo_cvm(url):
 
                     lista_dfs.append(df_mensal)
         
-        if not lista_dfs: return None
-        return pd.concat(lista_dfs, ignore_index=True)
+        df_segmentos = extrair_segmentos(zip_file)
+        if not lista_dfs: return pd.DataFrame(), df_segmentos
+        return pd.concat(lista_dfs, ignore_index=True), df_segmentos
     except Exception as e:
         print(f"  -> Erro ao processar o arquivo zip: {e}")
         return None
 
-def criar_banco_de_dados_vpa_completo():
+def extrair_segmentos(zip_file):
+    """
+    Lê o arquivo 'geral' de um zip de informes mensais da CVM já aberto e retorna o segmento
+    de atuação declarado mais recentemente por cada fundo (colunas 'cnpj', 'data_comptc'
+    e 'segmento'). Uma falha aqui não invalida o zip: o resultado só fica vazio.
+    """
+    vazio = pd.DataFrame(columns=COLUNAS_SEGMENTOS)
+    try:
+        lista_dfs = []
+        for nome_arquivo_csv in zip_file.namelist():
+            if 'geral' in nome_arquivo_csv:
+                with zip_file.open(nome_arquivo_csv, 'r') as csv_file:
+                    df_geral = pd.read_csv(csv_file, sep=';', encoding='latin-1', dtype=str)
+                df_geral.columns = df_geral.columns.str.lower()
+                df_geral.rename(columns={'cnpj_fundo': 'cnpj', 'cnpj_fundo_classe': 'cnpj',
+                                         'segmento_atuacao': 'segmento', 'data_referencia': 'data_comptc'}, inplace=True)
+                lista_dfs.append(df_geral)
+        if not lista_dfs:
+            return vazio
+        df_geral = pd.concat(lista_dfs, ignore_index=True)
+        df_geral['cnpj'] = df_geral['cnpj'].str.replace(r'\D', '', regex=True)
+        df_geral['segmento'] = df_geral['segmento'].str.strip()
+        df_geral = df_geral.dropna(subset=['cnpj', 'segmento'])
+        df_geral = df_geral[df_geral['segmento'] != '']
+        return df_geral.sort_values('data_comptc').drop_duplicates('cnpj', keep='last')[COLUNAS_SEGMENTOS]
+    except (KeyError, ValueError) as e:
+        print(f"  -> Não foi possível ler os segmentos dos fundos: {e}")
+        return vazio
+
+def carregar_manifesto():
+    """
+    Lê o manifesto de checkpoints (nome do zip -> validador HTTP e arquivo local).
+    """
+    if not os.path.exists(ARQUIVO_MANIFESTO):
+        return {}
+    try:
+        with open(ARQUIVO_MANIFESTO, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Manifesto de checkpoints ilegível, ignorando-o: {e}")
+        return {}
+
+def salvar_manifesto(manifesto):
+    """
+    Grava o manifesto de forma atômica, para que uma interrupção no meio da escrita
+    não corrompa o estado já salvo.
+    """
+    caminho_temporario = ARQUIVO_MANIFESTO + '.tmp'
+    with open(caminho_temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2, sort_keys=True)
+    os.replace(caminho_temporario, ARQUIVO_MANIFESTO)
+
+def obter_validador_remoto(url):
+    """
+    Consulta apenas os cabeçalhos do arquivo remoto (HEAD) para saber se ele mudou
+    desde o último checkpoint. Os arquivos do ano corrente são republicados pela CVM.
+    Retorna None se o servidor não mandar nenhum dos cabeçalhos usados: sem eles não há
+    como saber se o arquivo mudou, e ele precisa ser baixado de novo.
+    """
+    response = requisitar_com_retentativas(url, metodo='HEAD', timeout=30)
+    cabecalhos = response.headers
+    partes = [cabecalhos.get('ETag', ''), cabecalhos.get('Last-Modified', ''), cabecalhos.get('Content-Length', '')]
+    if not any(partes):
+        return None
+    return '|'.join(partes)
+
+def arquivo_de_ano_fechado(nome_do_arquivo_zip):
+    """
+    Indica se o zip é de um ano já encerrado (inf_mensal_fii_2020.zip ou ..._202003.zip),
+    que a CVM não republica mais.
+    """
+    ano = re.search(r'_(20\d{2})\d*\.zip$', nome_do_arquivo_zip)
+    return ano is not None and int(ano.group(1)) < date.today().year
+
+def ler_checkpoint(entrada):
+    """
+    Lê os DataFrames de informes e de segmentos de um checkpoint do manifesto.
+    Retorna None se ele não puder ser lido; os segmentos vêm None em checkpoints
+    gravados antes de eles serem extraídos.
+    """
+    try:
+        df_checkpoint = pd.read_pickle(os.path.join(PASTA_CHECKPOINTS, entrada['arquivo']))
+        df_segmentos = None
+        if 'segmentos' in entrada:
+            df_segmentos = pd.read_pickle(os.path.join(PASTA_CHECKPOINTS, entrada['segmentos']))
+        return df_checkpoint, df_segmentos
+    except (OSError, ValueError, EOFError) as e:
+        print(f"  -> Checkpoint inválido ({e}).")
+        return None
+
+def processar_com_checkpoint(url, manifesto):
+    """
+    Retorna os DataFrames de informes e de segmentos de um arquivo da CVM,
+    reaproveitando o checkpoint local quando o arquivo remoto não mudou. Caso contrário,
+    baixa, processa e grava um novo checkpoint. Retorna None em caso de falha.
+    """
+    nome_do_arquivo_zip = url.split('/')[-1]
+    entrada = manifesto.get(nome_do_arquivo_zip)
+    try:
+        validador = obter_validador_remoto(url)
+    except requests.exceptions.RequestException as e:
+        print(f"\n--- {nome_do_arquivo_zip}: não foi possível consultar o arquivo remoto: {e}")
+        # Um ano fechado não muda mais: o checkpoint dele continua valendo
+        if entrada and arquivo_de_ano_fechado(nome_do_arquivo_zip):
+            checkpoint = ler_checkpoint(entrada)
+            if checkpoint is not None:
+                print("  -> Arquivo de ano fechado: usando o checkpoint local.")
+                df_checkpoint, df_segmentos = checkpoint
+                return df_checkpoint, df_segmentos if df_segmentos is not None else pd.DataFrame(columns=COLUNAS_SEGMENTOS)
+        # Alguns servidores recusam o HEAD: tenta baixar o arquivo mesmo assim
+        validador = None
+
+    if entrada and validador is not None and entrada.get('validador') == validador:
+        print(f"\n--- {nome_do_arquivo_zip}: sem alterações, usando checkpoint local ---")
+        checkpoint = ler_checkpoint(entrada)
+        if checkpoint is not None and checkpoint[1] is not None:
+            return checkpoint
+        print("  -> Reprocessando o arquivo.")
+
+    resultado = processar_um_arquivo_cvm(url)
+    if resultado is None:
+        return None
+
+    arquivos = {'arquivo': nome_do_arquivo_zip.replace('.zip', '.pkl'),
+                'segmentos': nome_do_arquivo_zip.replace('.zip', '_segmentos.pkl')}
+    for df, nome_checkpoint in zip(resultado, arquivos.values()):
+        caminho_checkpoint = os.path.join(PASTA_CHECKPOINTS, nome_checkpoint)
+        df.to_pickle(caminho_checkpoint + '.tmp', compression=None)
+        os.replace(caminho_checkpoint + '.tmp', caminho_checkpoint)
+    manifesto[nome_do_arquivo_zip] = {'validador': validador, **arquivos}
+    salvar_manifesto(manifesto)
+    return resultado
+
+def criar_banco_de_dados_vpa_completo(armazenamento='particionado'):
     """
     Orquestra todo o processo com a nova lógica de busca e padronização corrigida.
+    Cada arquivo processado é salvo como checkpoint em disco, de modo que uma nova
+    execução retoma do ponto em que a anterior falhou. Se algum arquivo não puder
+    ser obtido, o banco NÃO é atualizado, para nunca publicar uma tabela incompleta.
+    Com armazenamento='particionado', o histórico vai para partições anuais em
+    database/particoes (utils/particoes.py) em vez de uma tabela do arquivo .db.
     """
     urls_dos_arquivos = encontrar_urls_disponiveis()
     if not urls_dos_arquivos:
         print("Pipeline interrompido.")
         return
 
+    os.makedirs(PASTA_CHECKPOINTS, exist_ok=True)
+    manifesto = carregar_manifesto()
+
     lista_completa_dfs = []
-    for url in urls_dos_arquivos:
-        df_processado = processar_um_arquivo_cvm(url)
-        if df_processado is not None and not df_processado.empty:
-            lista_completa_dfs.append(df_processado)
+    lista_segmentos = []
+    arquivos_com_falha = []
+    for ordem, url in enumerate(urls_dos_arquivos):
+        resultado = processar_com_checkpoint(url, manifesto)
+        if resultado is None:
+            arquivos_com_falha.append(url.split('/')[-1])
+            continue
+        df_processado, df_segmentos = resultado
+        if not df_processado.empty:
+            # A ordem do arquivo desempata informes repetidos em arquivos sobrepostos
+            lista_completa_dfs.append(df_processado.assign(ordem_arquivo=ordem))
+        if not df_segmentos.empty:
+            lista_segmentos.append(df_segmentos.assign(ordem_arquivo=ordem))
+
+    if arquivos_com_falha:
+        print(f"\nPipeline interrompido: {len(arquivos_com_falha)} arquivo(s) falharam: {', '.join(arquivos_com_falha)}")
+        print("Os arquivos processados com sucesso ficaram salvos como checkpoint; execute novamente para retomar.")
+        return
 
     if not lista_completa_dfs:
         print("Pipeline interrompido: nenhum dado foi processado com sucesso.")
@@ -122,8 +317,13 @@ def criar_banco_de_dados_vpa_completo():
     df_master.dropna(subset=numeric_cols, inplace=True)
     df_master = df_master[df_master['qt_cotas'] > 0]
     df_master['vpa'] = df_master['valor_patrim_liq'] / df_master['qt_cotas']
-    df_final = df_master[['cnpj', 'data_comptc', 'vpa']].copy()
-    df_final.sort_values(by=['cnpj', 'data_comptc'], inplace=True)
+    if 'versao' in df_master.columns:
+        df_master['versao'] = pd.to_numeric(df_master['versao'], errors='coerce').fillna(0)
+    else:
+        df_master['versao'] = 0
+
+    print("Deduplicando e validando os registros de VPA...")
+    df_final, df_quarentena = validar_vpa(df_master[['cnpj', 'data_comptc', 'vpa', 'versao', 'ordem_arquivo']])
     
     print("Limpeza finalizada. Dados prontos para serem salvos.")
     
@@ -133,19 +333,47 @@ def criar_banco_de_dados_vpa_completo():
 
     nome_banco = 'database/dados_fii.db'
     nome_tabela = 'vpa_historico'
+    nome_tabela_quarentena = 'vpa_quarentena'
     try:
         conn = sqlite3.connect(nome_banco)
-        df_final.to_sql(nome_tabela, conn, if_exists='replace', index=False)
+        if armazenamento == 'particionado':
+            particoes.gravar_tabela(df_final, nome_tabela)
+            conn.execute(f"DROP TABLE IF EXISTS {nome_tabela}")
+        else:
+            df_final.to_sql(nome_tabela, conn, if_exists='replace', index=False)
+            # Índice usado pelas consultas por fundo e janela de tempo do app
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{nome_tabela}_cnpj_data ON {nome_tabela} (cnpj, data_comptc)")
+        df_quarentena.to_sql(nome_tabela_quarentena, conn, if_exists='replace', index=False)
+        # O segmento de atuação (usado na página Explorar) é o declarado mais recentemente nos
+        # arquivos 'geral' dos zips; sem nenhum, o app mantém a tabela anterior ou deduz o segmento pelo nome
+        if lista_segmentos:
+            df_segmentos = pd.concat(lista_segmentos, ignore_index=True).sort_values(['data_comptc', 'ordem_arquivo'], kind='stable')
+            df_segmentos = df_segmentos.drop_duplicates('cnpj', keep='last')[['cnpj', 'segmento']]
+            df_segmentos.to_sql('segmentos_fiis', conn, if_exists='replace', index=False)
+            print(f"Segmentos gravados para {len(df_segmentos)} fundos.")
+        # Registra quais fundos mudaram, para que o app invalide só o cache deles
+        registrar_versao(conn, 'vpa', calcular_hashes_por_grupo(df_final, 'cnpj', ['data_comptc', 'vpa']))
+        conn.commit()
+        # Devolve ao sistema o espaço das tabelas apagadas, para o .db versionado continuar pequeno
+        conn.execute("VACUUM")
         conn.close()
         print(f"\nSUCESSO! O banco de dados '{nome_banco}' foi criado/atualizado com a tabela '{nome_tabela}'.")
         print(f"Total de registros salvos: {len(df_final)}")
+        print(f"Registros em quarentena para revisão (tabela '{nome_tabela_quarentena}'): {len(df_quarentena)}")
     except Exception as e:
         print(f"Erro ao salvar os dados no banco SQLite: {e}")
+        return None
     return df_final
 
 # --- Ponto de partida para executar o script ---
 if __name__ == "__main__":
-    df_final_vpa = criar_banco_de_dados_vpa_completo()
-    if df_final_vpa is not None:
-        print("\n--- Amostra dos Dados Finais Salvos (ordenados pelos mais recentes) ---")
-        print(df_final_vpa.sort_values('data_comptc', ascending=False).head())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Baixa os informes mensais da CVM e atualiza o histórico de VPA dos FIIs.")
+    parser.add_argument('--armazenamento', choices=['particionado', 'sqlite'], default='particionado',
+                        help="Partições anuais compactadas (padrão) ou tabela dentro do arquivo .db.")
+    args = parser.parse_args()
+    df_final_vpa = criar_banco_de_dados_vpa_completo(args.armazenamento)
+    if df_final_vpa is None:
+        # Código de saída diferente de zero faz o workflow falhar sem commitar dados parciais
+        sys.exit(1)
+    print("\n--- Amostra dos Dados Finais Salvos (ordenados pelos mais recentes) ---")
+    print(df_final_vpa.sort_values('data_comptc', ascending=False).head())
\ No newline at end of file
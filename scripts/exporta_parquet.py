@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+
+# Exporta as tabelas analíticas (VPA e séries de P/VP) para Parquet, em
+# database/parquet/<tabela>.parquet. A página Explorar lê essa exportação colunar direto
+# pelo DuckDB sempre que ela for mais nova que os dados de origem.
+# Uso: python scripts/exporta_parquet.py [--forcar]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import analitico
+
+def exportar_parquet(forcar=False):
+    """
+    Grava um arquivo Parquet por tabela analítica. Tabelas cuja exportação já está em dia
+    são puladas, a menos que forcar=True. Retorna False se o duckdb não estiver instalado.
+    """
+    try:
+        import duckdb
+    except ImportError:
+        print("A exportação usa o pacote opcional duckdb: pip install duckdb")
+        return False
+
+    os.makedirs(analitico.PASTA_PARQUET, exist_ok=True)
+    conn = duckdb.connect(':memory:')
+    for tabela in analitico.TABELAS_ANALITICAS:
+        fonte = analitico.escolher_fonte(tabela)
+        if fonte == 'parquet' and not forcar:
+            print(f"Tabela '{tabela}': exportação já está em dia.")
+            continue
+        if fonte == 'parquet':
+            # Reexportação forçada: lê da origem, e não da própria exportação
+            os.remove(analitico.caminho_parquet(tabela))
+            fonte = analitico.escolher_fonte(tabela)
+        if fonte is None:
+            print(f"Tabela '{tabela}': não encontrada, nada a exportar.")
+            continue
+        analitico.carregar_tabela_duckdb(conn, tabela, fonte)
+        caminho = analitico.caminho_parquet(tabela)
+        conn.table(tabela).write_parquet(caminho + '.tmp', compression='zstd')
+        os.replace(caminho + '.tmp', caminho)
+        print(f"Tabela '{tabela}' ({fonte}): {conn.table(tabela).count('*').fetchone()[0]} registros em {caminho}.")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta as tabelas analíticas para Parquet (usadas pela página Explorar).")
+    parser.add_argument('--forcar', action='store_true', help="Reexporta mesmo as tabelas cuja exportação está em dia.")
+    args = parser.parse_args()
+    if not exportar_parquet(forcar=args.forcar):
+        sys.exit(1)
@@ -0,0 +1,89 @@
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+
+# Mede, para cada página, o tempo de importação dos módulos e o tempo da primeira
+# renderização, sempre num processo Python novo (partida a frio).
+# Uso: python scripts/perfil_inicializacao.py --orcamento-ms 1500
+PASTA_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARCA_INICIO = '@@INICIO_RENDERIZACAO@@'
+MARCA_FIM = '@@FIM_RENDERIZACAO@@'
+
+CODIGO_FILHO = f"""
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+print({MARCA_INICIO!r}, file=sys.stderr, flush=True)
+inicio = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+duracao_ms = (time.perf_counter() - inicio) * 1000
+print({MARCA_FIM!r}, file=sys.stderr, flush=True)
+print(json.dumps({{'primeira_renderizacao_ms': duracao_ms, 'erro': len(at.exception) > 0}}))
+"""
+
+def listar_paginas():
+    return ['main.py'] + sorted(os.path.relpath(p, PASTA_PROJETO) for p in glob.glob(os.path.join(PASTA_PROJETO, 'pages', '*.py')))
+
+def somar_importacoes(saida_importtime):
+    """
+    Soma o tempo cumulativo das importações de primeiro nível feitas durante a renderização,
+    agrupado pelo pacote raiz. Retorna um dicionário {pacote: milissegundos}.
+    """
+    por_pacote = {}
+    dentro = False
+    for linha in saida_importtime.splitlines():
+        if linha == MARCA_INICIO:
+            dentro = True
+            continue
+        if linha == MARCA_FIM:
+            break
+        if not dentro or not linha.startswith('import time:') or '|' not in linha:
+            continue
+        partes = linha.split('|')
+        nome = partes[2]
+        # Apenas importações de primeiro nível (sem indentação), para não contar em dobro
+        if nome.startswith('  ') or not partes[1].strip().isdigit():
+            continue
+        pacote = nome.strip().split('.')[0]
+        por_pacote[pacote] = por_pacote.get(pacote, 0) + int(partes[1]) / 1000
+    return por_pacote
+
+def perfilar_pagina(pagina):
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CODIGO_FILHO, pagina],
+        cwd=PASTA_PROJETO, capture_output=True, text=True
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(f"Falha ao renderizar {pagina}:\n{resultado.stderr[-2000:]}")
+    medidas = json.loads(resultado.stdout.strip().splitlines()[-1])
+    medidas['importacoes_ms'] = somar_importacoes(resultado.stderr)
+    return medidas
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de inicialização (importações e primeira renderização) das páginas.")
+    parser.add_argument('--orcamento-ms', type=float, default=None,
+                        help="Falha (código de saída 1) se alguma página passar deste tempo de primeira renderização.")
+    parser.add_argument('--top', type=int, default=5, help="Quantos pacotes mais lentos listar por página.")
+    args = parser.parse_args()
+
+    estourou = False
+    for pagina in listar_paginas():
+        medidas = perfilar_pagina(pagina)
+        total_importacoes = sum(medidas['importacoes_ms'].values())
+        situacao = ''
+        if args.orcamento_ms is not None and medidas['primeira_renderizacao_ms'] > args.orcamento_ms:
+            situacao = '  <-- ACIMA DO ORÇAMENTO'
+            estourou = True
+        print(f"\n{pagina}: primeira renderização {medidas['primeira_renderizacao_ms']:.0f} ms "
+              f"(importações {total_importacoes:.0f} ms){' [com exceção]' if medidas['erro'] else ''}{situacao}")
+        mais_lentos = sorted(medidas['importacoes_ms'].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for pacote, ms in mais_lentos:
+            print(f"    {pacote:<24} {ms:8.1f} ms")
+
+    if estourou:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import io
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Simula N sessões simultâneas das páginas de P/VP e de Aportes num único processo,
+# como no servidor do Streamlit (os caches da camada de consultas são compartilhados).
+# Os preços vêm de um provedor local determinístico e a planilha da B3 é gerada aqui,
+# de modo que o teste roda sem rede e os resultados são comparáveis entre execuções.
+# Uso: python scripts/teste_carga.py --sessoes 50 --concorrencia 8 --p95-max-ms 3000
+PASTA_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PASTA_PROJETO)
+
+PAGINAS = {'PVP': os.path.join(PASTA_PROJETO, 'pages', 'PVP.py'), 'Aportes': os.path.join(PASTA_PROJETO, 'pages', 'Aportes.py')}
+JANELAS_ANOS = (1, 3, 5, 10, 15)
+TAMANHO_UNIVERSO = 30   # Tickers sorteados; a popularidade segue uma lei de Zipf, como no uso real
+
+def instalar_provedor_de_precos(latencia_ms):
+    """
+    Instala um provedor de cotações sintéticas determinísticas (uma senoide por ticker),
+    com a latência de rede simulada pedida em cada lote.
+    """
+    import numpy as np
+    import pandas as pd
+    from utils import provedores
+
+    class ProvedorSintetico(provedores.ProvedorPrecos):
+        nome = 'sintetico'
+
+        def _baixar_lote(self, tickers, data_inicial, data_final):
+            if latencia_ms:
+                time.sleep(latencia_ms / 1000)
+            fim = pd.Timestamp(data_final) if data_final is not None else pd.Timestamp.today().normalize()
+            indice = pd.bdate_range(pd.Timestamp(data_inicial), fim, inclusive='left')
+            dias = indice.to_julian_date().to_numpy()[:, None]
+            fases = np.array([sum(map(ord, ticker)) % 97 for ticker in tickers])[None, :]
+            return pd.DataFrame(100 + 10 * np.sin(dias / 30 + fases), index=indice, columns=tickers)
+
+    provedores.definir_provedor(ProvedorSintetico())
+
+def gerar_planilha_b3(tickers, semente, linhas=300):
+    """
+    Gera os bytes de uma planilha de negociação no formato exportado pelo portal da B3.
+    """
+    import pandas as pd
+    aleatorio = random.Random(semente)
+    datas = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=5 * 252)
+    registros = []
+    for _ in range(linhas):
+        registros.append({
+            'Data do Negócio': aleatorio.choice(datas).strftime('%d/%m/%Y'),
+            'Tipo de Movimentação': aleatorio.choice(['Compra'] * 9 + ['Venda']),
+            'Mercado': 'Mercado à Vista',
+            'Prazo/Vencimento': '-',
+            'Instituição': aleatorio.choice(['XP INVESTIMENTOS CCTVM S/A', 'NU INVEST CORRETORA DE VALORES S.A.']),
+            'Código de Negociação': aleatorio.choice(tickers),
+            'Quantidade': aleatorio.randint(1, 50),
+            'Preço': f"R$ {aleatorio.uniform(5, 150):.2f}".replace('.', ','),
+            'Valor': 0,
+        })
+    saida = io.BytesIO()
+    pd.DataFrame(registros).to_excel(saida, index=False)
+    return saida.getvalue()
+
+def uso_memoria_mb():
+    """
+    Memória residente atual do processo (Linux), ou o pico, onde /proc não existir.
+    """
+    try:
+        with open('/proc/self/status') as arquivo:
+            for linha in arquivo:
+                if linha.startswith('VmRSS:'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class Medidor:
+    def __init__(self):
+        self.latencias_ms = {}
+        self.erros = 0
+        self._trava = threading.Lock()
+
+    def registrar(self, etapa, duracao_ms, erros=0):
+        with self._trava:
+            self.latencias_ms.setdefault(etapa, []).append(duracao_ms)
+            self.erros += erros
+
+    def medir(self, etapa, funcao):
+        """
+        Executa a página (funcao retorna o AppTest) e registra a latência e as exceções.
+        """
+        inicio = time.perf_counter()
+        at = funcao()
+        self.registrar(etapa, (time.perf_counter() - inicio) * 1000, len(at.exception))
+        return at
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def botao(at, rotulo):
+    return next(b for b in at.button if b.label == rotulo)
+
+def preparar_sessoes_simultaneas():
+    """
+    O AppTest foi feito para uma sessão por vez: cada execução instala um Runtime falso
+    e uma opção de configuração globais e os desfaz ao terminar, o que derruba as execuções
+    simultâneas. Aqui a opção fica ligada durante todo o teste e, na falta de um Runtime
+    instalado, as sessões usam o último que existiu.
+    """
+    from streamlit import config
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.testing.v1.util import build_mock_config_get_option
+    config.get_option = build_mock_config_get_option({'global.appTest': True})
+    ultimo = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            ultimo['runtime'] = cls._instance
+            return cls._instance
+        if 'runtime' in ultimo:
+            return ultimo['runtime']
+        raise RuntimeError("Runtime hasn't been created!")
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or 'runtime' in ultimo)
+
+def sessao_pvp(medidor, universo, pesos, aleatorio, timeout):
+    from streamlit.testing.v1 import AppTest
+    at = medidor.medir('PVP: abertura', lambda: AppTest.from_file(PAGINAS['PVP'], default_timeout=timeout).run())
+    at.selectbox[0].select(aleatorio.choices(universo, pesos)[0])
+    at.number_input[0].set_value(aleatorio.choice(JANELAS_ANOS))
+    return medidor.medir('PVP: gráfico', lambda: at.button[0].click().run())
+
+def sessao_aportes(medidor, planilha, aleatorio, timeout):
+    from streamlit.testing.v1 import AppTest
+    at = medidor.medir('Aportes: abertura', lambda: AppTest.from_file(PAGINAS['Aportes'], default_timeout=timeout).run())
+    at.file_uploader[0].upload('negociacao.xlsx', planilha)
+    at = medidor.medir('Aportes: upload e análise', lambda: at.button[0].click().run())
+    at.selectbox[0].select(aleatorio.choice(at.selectbox[0].options))
+    return medidor.medir('Aportes: gráfico', lambda: botao(at, 'Gerar Gráfico').click().run())
+
+def coletar_caches():
+    """
+    Encontra todos os caches (CacheComValidade) dos módulos do app já importados.
+    """
+    from utils.cache import CacheComValidade
+    caches = {}
+    for nome_modulo, modulo in list(sys.modules.items()):
+        if not (nome_modulo.startswith('utils.') or nome_modulo == 'api'):
+            continue
+        for nome, objeto in vars(modulo).items():
+            if isinstance(objeto, CacheComValidade):
+                caches[f"{nome_modulo.split('.')[-1]}.{nome}"] = objeto
+    return caches
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga das páginas do Streamlit com sessões simultâneas.")
+    parser.add_argument('--sessoes', type=int, default=20, help="Número de sessões simuladas.")
+    parser.add_argument('--concorrencia', type=int, default=8, help="Sessões executadas ao mesmo tempo.")
+    parser.add_argument('--paginas', nargs='+', choices=list(PAGINAS), default=list(PAGINAS))
+    parser.add_argument('--latencia-precos-ms', type=float, default=200, help="Latência simulada de cada download de preços.")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--timeout', type=float, default=120, help="Tempo máximo de cada execução da página (s).")
+    parser.add_argument('--p95-max-ms', type=float, default=None,
+                        help="Falha (código de saída 1) se o p95 de alguma etapa passar deste valor.")
+    args = parser.parse_args()
+
+    from utils import consultas
+    instalar_provedor_de_precos(args.latencia_precos_ms)
+    preparar_sessoes_simultaneas()
+    aleatorio = random.Random(args.semente)
+    # Só fundos com VPA no banco, para exercitar o caminho completo dos gráficos
+    com_vpa = sorted(consultas.carregar_ultimo_vpa()['ticker'])
+    universo = aleatorio.sample(com_vpa, min(TAMANHO_UNIVERSO, len(com_vpa)))
+    pesos = [1 / posicao for posicao in range(1, len(universo) + 1)]
+    planilha = gerar_planilha_b3(universo, args.semente)
+
+    import logging
+    # As sessões acessam o estado do AppTest fora da thread do script, o que gera um aviso por chamada
+    logging.getLogger('streamlit.runtime.scriptrunner_utils.script_run_context').addFilter(
+        lambda registro: 'missing ScriptRunContext' not in registro.getMessage()
+    )
+
+    medidor = Medidor()
+    sessoes_vivas = []
+
+    def executar(indice):
+        aleatorio_sessao = random.Random(args.semente + indice)
+        pagina = args.paginas[indice % len(args.paginas)]
+        if pagina == 'PVP':
+            at = sessao_pvp(medidor, universo, pesos, aleatorio_sessao, args.timeout)
+        else:
+            at = sessao_aportes(medidor, planilha, aleatorio_sessao, args.timeout)
+        # A sessão fica viva até o fim, como a de um usuário com a aba aberta
+        sessoes_vivas.append(at)
+
+    # Os acertos e falhas da preparação acima não entram nas taxas
+    estatisticas_iniciais = {nome: cache.estatisticas() for nome, cache in coletar_caches().items()}
+    memoria_inicial = uso_memoria_mb()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concorrencia, thread_name_prefix='sessao') as executor:
+        list(executor.map(executar, range(args.sessoes)))
+    duracao_s = time.perf_counter() - inicio
+    memoria_final = uso_memoria_mb()
+
+    print(f"\n{args.sessoes} sessões ({args.concorrencia} simultâneas) em {duracao_s:.1f} s, {medidor.erros} exceção(ões) nas páginas")
+    print(f"Memória: {memoria_inicial:.0f} MB -> {memoria_final:.0f} MB "
+          f"({(memoria_final - memoria_inicial) / max(args.sessoes, 1):.1f} MB por sessão, incluindo os caches)")
+
+    estourou = False
+    print(f"\n{'Etapa':<30} {'n':>5} {'p50 (ms)':>10} {'p95 (ms)':>10} {'máx (ms)':>10}")
+    for etapa, valores in medidor.latencias_ms.items():
+        p95 = percentil(valores, 95)
+        situacao = ''
+        if args.p95_max_ms is not None and p95 > args.p95_max_ms:
+            situacao = '  <-- ACIMA DO LIMITE'
+            estourou = True
+        print(f"{etapa:<30} {len(valores):>5} {statistics.median(valores):>10.0f} {p95:>10.0f} {max(valores):>10.0f}{situacao}")
+
+    print(f"\n{'Cache':<40} {'itens':>6} {'acertos':>8} {'falhas':>7} {'taxa':>6}")
+    for nome, cache in sorted(coletar_caches().items()):
+        medidas = cache.estatisticas()
+        iniciais = estatisticas_iniciais.get(nome, {'acertos': 0, 'falhas': 0})
+        acertos = medidas['acertos'] - iniciais['acertos']
+        falhas = medidas['falhas'] - iniciais['falhas']
+        if acertos + falhas:
+            print(f"{nome:<40} {medidas['itens']:>6} {acertos:>8} {falhas:>7} {acertos / (acertos + falhas):>6.0%}")
+
+    if medidor.erros or estourou:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
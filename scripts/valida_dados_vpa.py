@@ -0,0 +1,78 @@
+import pandas as pd
+import numpy as np
+
+# --- PARÂMETROS DA VALIDAÇÃO ---
+JANELA_OUTLIER = 7            # Meses considerados na mediana móvel (centrada)
+LIMIAR_Z_ROBUSTO = 6.0        # |z robusto| acima deste valor é sinalizado como salto
+MAD_MINIMO_RELATIVO = 0.005   # Piso do MAD (0,5% da mediana) para séries quase constantes
+DATA_MINIMA = pd.Timestamp('1990-01-01')
+
+def deduplicar_registros(df):
+    """
+    Mantém apenas o último informe de cada (cnpj, data_comptc).
+    O critério é a maior 'versao' (reapresentações do fundo) e, em empate, o arquivo
+    publicado por último ('ordem_arquivo'), já que arquivos anuais e mensais se sobrepõem.
+    Retorna o DataFrame deduplicado e as linhas substituídas cujo VPA era diferente.
+    """
+    df = df.sort_values(['cnpj', 'data_comptc', 'versao', 'ordem_arquivo'], kind='stable')
+    mascara_ultimo = ~df.duplicated(subset=['cnpj', 'data_comptc'], keep='last')
+    df_mantidos = df[mascara_ultimo]
+    df_substituidos = df[~mascara_ultimo]
+
+    # Duplicatas idênticas não interessam à revisão; só as correções de valor
+    df_comparacao = df_substituidos.merge(
+        df_mantidos[['cnpj', 'data_comptc', 'vpa']], on=['cnpj', 'data_comptc'], suffixes=('', '_mantido')
+    )
+    mascara_alterados = ~np.isclose(df_comparacao['vpa'], df_comparacao['vpa_mantido'], equal_nan=True)
+    df_alterados = df_comparacao.loc[mascara_alterados, ['cnpj', 'data_comptc', 'vpa']].assign(motivo='substituido_por_reapresentacao')
+    return df_mantidos, df_alterados
+
+def rejeitar_valores_impossiveis(df):
+    """
+    Separa os registros com VPA não finito ou não positivo, ou com datas fora do intervalo plausível.
+    """
+    vpa = df['vpa'].to_numpy(dtype=float)
+    limite_futuro = pd.Timestamp.now().normalize() + pd.DateOffset(months=1)
+    mascara_invalida = (
+        ~np.isfinite(vpa) | (vpa <= 0)
+        | df['data_comptc'].isna().to_numpy()
+        | (df['data_comptc'] < DATA_MINIMA).to_numpy()
+        | (df['data_comptc'] > limite_futuro).to_numpy()
+    )
+    df_rejeitados = df.loc[mascara_invalida, ['cnpj', 'data_comptc', 'vpa']].assign(motivo='valor_impossivel')
+    return df[~mascara_invalida], df_rejeitados
+
+def sinalizar_saltos(df):
+    """
+    Sinaliza saltos atípicos de VPA por fundo usando mediana móvel e MAD (desvio absoluto mediano).
+    Espera o DataFrame ordenado por (cnpj, data_comptc). Os registros sinalizados NÃO são
+    removidos, pois grupamentos e amortizações produzem saltos legítimos; vão apenas para revisão.
+    """
+    agrupado = df.groupby('cnpj', sort=False)
+    mediana = agrupado['vpa'].rolling(JANELA_OUTLIER, center=True, min_periods=3).median().reset_index(level=0, drop=True)
+    desvio = (df['vpa'] - mediana).abs()
+    mad = desvio.groupby(df['cnpj'], sort=False).rolling(JANELA_OUTLIER, center=True, min_periods=3).median().reset_index(level=0, drop=True)
+    mad = np.maximum(mad, mediana.abs() * MAD_MINIMO_RELATIVO)
+
+    z_robusto = 0.6745 * desvio / mad
+    mascara_salto = (z_robusto > LIMIAR_Z_ROBUSTO).fillna(False)
+    return df.loc[mascara_salto, ['cnpj', 'data_comptc', 'vpa']].assign(motivo='salto_atipico')
+
+def validar_vpa(df):
+    """
+    Etapa de validação vetorizada do histórico de VPA.
+    Recebe as colunas 'cnpj', 'data_comptc', 'vpa', 'versao' e 'ordem_arquivo' e retorna
+    (df_final, df_quarentena): o histórico limpo e ordenado, e a tabela de registros para revisão.
+    """
+    df_valido, df_rejeitados = rejeitar_valores_impossiveis(df)
+    df_unico, df_substituidos = deduplicar_registros(df_valido)
+    df_final = df_unico[['cnpj', 'data_comptc', 'vpa']].reset_index(drop=True)
+    df_saltos = sinalizar_saltos(df_final)
+
+    df_quarentena = pd.concat([df_rejeitados, df_substituidos, df_saltos], ignore_index=True)
+    df_quarentena.sort_values(['cnpj', 'data_comptc'], inplace=True)
+
+    print(f"Validação: {len(df) - len(df_final) - len(df_rejeitados)} duplicata(s) removida(s), "
+          f"{len(df_rejeitados)} valor(es) impossível(is) rejeitado(s), "
+          f"{len(df_saltos)} salto(s) atípico(s) sinalizado(s).")
+    return df_final, df_quarentena
@@ -0,0 +1,65 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+import api
+
+# --- VALIDAÇÃO DOS PARÂMETROS ---
+@pytest.mark.parametrize('consulta', ['anos=inf', 'anos=nan', 'anos=2.7', 'anos=abc', 'anos=0', 'anos=21'])
+def test_anos_invalido(consulta):
+    with pytest.raises(api.ErroRequisicao) as erro:
+        api.resolver_rota('/pvp/HGLG11', parse_qs(consulta))
+    assert erro.value.status == 400
+
+def test_anos_valido():
+    assert api.resolver_rota('/pvp/hglg11', parse_qs('anos=10')) == ('pvp', ('HGLG11', 10))
+    assert api.resolver_rota('/pvp/HGLG11', {}) == ('pvp', ('HGLG11', 5))
+
+@pytest.mark.parametrize('consulta', ['pvp_max=nan', 'pvp_min=nan', 'pvp_min=-inf', 'pvp_max=abc'])
+def test_screener_invalido(consulta):
+    with pytest.raises(api.ErroRequisicao) as erro:
+        api.resolver_rota('/screener', parse_qs(consulta))
+    assert erro.value.status == 400
+
+def test_screener_valido():
+    assert api.resolver_rota('/screener', parse_qs('pvp_min=0.8&pvp_max=1')) == ('screener', (0.8, 1.0))
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), api.ManipuladorAPI)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{servidor.server_port}'
+    servidor.shutdown()
+    servidor.server_close()
+
+@pytest.mark.parametrize('caminho', ['/pvp/HGLG11?anos=inf', '/pvp/HGLG11?anos=nan', '/pvp/HGLG11?anos=2.7',
+                                     '/screener?pvp_max=nan'])
+def test_parametro_invalido_responde_400(servidor, caminho):
+    with pytest.raises(urllib.error.HTTPError) as erro:
+        urllib.request.urlopen(servidor + caminho)
+    assert erro.value.code == 400
+    assert 'erro' in json.loads(erro.value.read())
+
+# --- REQUISIÇÃO CONDICIONAL E COMPRESSÃO ---
+ETAG = '"abc123"'
+
+@pytest.mark.parametrize('cabecalho', ['"abc123"', 'W/"abc123"', '"outro", "abc123"', '"outro",W/"abc123"', '*'])
+def test_etag_corresponde(cabecalho):
+    assert api._etag_corresponde(cabecalho, ETAG)
+
+@pytest.mark.parametrize('cabecalho', [None, '', '"outro"', '"abc1234"', 'W/"outro", "xyz"'])
+def test_etag_nao_corresponde(cabecalho):
+    assert not api._etag_corresponde(cabecalho, ETAG)
+
+@pytest.mark.parametrize('cabecalho', ['gzip', 'gzip, deflate, br', 'br;q=1.0, gzip;q=0.5', 'x-gzip', '*', 'identity, *;q=0.1'])
+def test_aceita_gzip(cabecalho):
+    assert api._aceita_gzip(cabecalho)
+
+@pytest.mark.parametrize('cabecalho', [None, '', 'identity', 'gzip;q=0', 'gzip; q=0.0, br', 'br, *;q=0', '*, gzip;q=0'])
+def test_recusa_gzip(cabecalho):
+    assert not api._aceita_gzip(cabecalho)
@@ -0,0 +1,280 @@
+import glob
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing
+
+from utils import consultas, particoes
+from utils.cache import cache_com_validade
+
+# --- CONSULTAS ANALÍTICAS ENTRE FUNDOS (página Explorar) ---
+# Com o pacote opcional duckdb instalado, as tabelas grandes são lidas direto dos arquivos
+# (exportação em Parquet, se houver e estiver em dia, ou as partições .csv.gz) para um banco
+# DuckDB em memória, recarregado só quando os dados mudam, e as agregações por segmento e
+# período rodam em SQL vetorizado. Sem o duckdb, as mesmas consultas são feitas em pandas.
+PASTA_PARQUET = os.path.join(consultas.PASTA_PROJETO, 'database', 'parquet')
+TABELAS_ANALITICAS = ('vpa_historico', 'pvp_semanal', 'pvp_mensal')
+TABELA_SEGMENTOS = 'segmentos_fiis'
+TIPOS_DUCKDB = {'TEXT': 'VARCHAR', 'REAL': 'DOUBLE', 'INTEGER': 'BIGINT', 'TIMESTAMP': 'TIMESTAMP'}
+
+# rótulo exibido: (unidade do date_trunc do DuckDB, frequência do pandas)
+PERIODOS = {'Mês': ('month', 'M'), 'Trimestre': ('quarter', 'Q'), 'Ano': ('year', 'Y')}
+# rótulo exibido: (expressão SQL sobre {coluna}, agregação do pandas)
+ESTATISTICAS = {
+    'Mediana': ('median({coluna})', 'median'),
+    'Média': ('avg({coluna})', 'mean'),
+    'Percentil 25': ('quantile_cont({coluna}, 0.25)', lambda serie: serie.quantile(0.25)),
+    'Percentil 75': ('quantile_cont({coluna}, 0.75)', lambda serie: serie.quantile(0.75)),
+}
+
+# Fundos sem segmento declarado à CVM são classificados pelo nome (a primeira regra que casar).
+# Os rótulos seguem os da CVM, para que as duas origens caiam nos mesmos grupos.
+SEGMENTOS_POR_NOME = [
+    (r'FUNDO DE FUNDOS|FUNDOS DE INVESTIMENTO IMOBILI|\bFOF\b', 'Fundo de Fundos'),
+    (r'RECEB[ÍI]VEIS|\bCRI\b|CR[ÉE]DITO|T[ÍI]TULOS|HIGH YIELD', 'Títulos e Val. Mob.'),
+    (r'LOG[ÍI]STIC|GALP[ÕO]ES|INDUSTRIAL', 'Logística'),
+    (r'SHOPPING|\bMALLS?\b|VAREJO|OUTLET', 'Shoppings'),
+    (r'CORPORATIV|OFFICE|LAJES|EDIF[ÍI]CIO|ESCRIT[ÓO]RIO', 'Lajes Corporativas'),
+    (r'HOT[ÉE]IS|HOTEL', 'Hotel'),
+    (r'RESIDENCIA', 'Residencial'),
+    (r'HOSPITA|SA[ÚU]DE', 'Hospital'),
+    (r'EDUCACION|UNIVERSI', 'Educacional'),
+    (r'AGRO|TERRAS AGR', 'Agronegócio'),
+    (r'MULTIESTRAT|H[ÍI]BRIDO', 'Híbrido'),
+]
+SEGMENTO_PADRAO = 'Outros'
+
+def duckdb_disponivel():
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def classificar_por_nome(nome_fundo):
+    """
+    Deduz o segmento de um FII pelo nome, quando a CVM não informa.
+    """
+    nome = (nome_fundo or '').upper()
+    for padrao, segmento in SEGMENTOS_POR_NOME:
+        if re.search(padrao, nome):
+            return segmento
+    return SEGMENTO_PADRAO
+
+def carregar_segmentos():
+    """
+    Retorna o segmento de cada fundo cadastrado (colunas 'ticker', 'cnpj', 'segmento' e
+    'origem'): o declarado no informe mensal mais recente da CVM (tabela segmentos_fiis,
+    gravada por scripts/carrega_dados_vpa.py) ou, na falta dele, o deduzido pelo nome.
+    """
+    import pandas as pd
+    df_cadastro = consultas.carregar_cadastro()
+    try:
+        with closing(consultas.conectar(com_particoes=False)) as conn:
+            df_cvm = pd.read_sql_query(f"SELECT cnpj, segmento FROM {TABELA_SEGMENTOS}", conn)
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        df_cvm = pd.DataFrame(columns=['cnpj', 'segmento'])
+
+    df_segmentos = df_cadastro.merge(df_cvm.drop_duplicates('cnpj'), on='cnpj', how='left')
+    sem_segmento = df_segmentos['segmento'].isna()
+    df_segmentos['origem'] = 'cvm'
+    df_segmentos.loc[sem_segmento, 'origem'] = 'nome'
+    df_segmentos.loc[sem_segmento, 'segmento'] = df_segmentos.loc[sem_segmento, 'nome_fundo'].map(classificar_por_nome)
+    return df_segmentos[['ticker', 'cnpj', 'segmento', 'origem']]
+
+# --- ORIGEM E CARGA DAS TABELAS ---
+def caminho_parquet(tabela):
+    return os.path.join(PASTA_PARQUET, f'{tabela}.parquet')
+
+def _arquivos_particao(tabela):
+    return sorted(glob.glob(os.path.join(particoes.PASTA_PARTICOES, tabela, '*.csv.gz')))
+
+def _tabelas_no_banco():
+    with closing(consultas.conectar(com_particoes=False)) as conn:
+        return {linha[0] for linha in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+def escolher_fonte(tabela, tabelas_no_banco=None):
+    """
+    Indica de onde a tabela é lida: 'parquet', 'particoes', 'sqlite' ou None (inexistente).
+    Segue a precedência do app (a tabela no banco principal vem antes das partições), e a
+    exportação em Parquet só é usada se for mais nova que a origem dos dados.
+    """
+    if tabelas_no_banco is None:
+        tabelas_no_banco = _tabelas_no_banco()
+    if tabela in tabelas_no_banco:
+        fonte, atualizado_em = 'sqlite', os.path.getmtime(consultas.CAMINHO_BANCO)
+    elif _arquivos_particao(tabela):
+        fonte, atualizado_em = 'particoes', max(os.path.getmtime(caminho) for caminho in _arquivos_particao(tabela))
+    else:
+        fonte, atualizado_em = None, 0
+    exportacao = caminho_parquet(tabela)
+    if os.path.exists(exportacao) and os.path.getmtime(exportacao) >= atualizado_em:
+        return 'parquet'
+    return fonte
+
+def _assinatura():
+    """
+    Identifica o estado dos arquivos de que as consultas dependem (banco, partições e Parquet).
+    """
+    caminhos = [consultas.CAMINHO_BANCO]
+    for tabela in TABELAS_ANALITICAS:
+        caminhos += _arquivos_particao(tabela) + [caminho_parquet(tabela)]
+    itens = []
+    for caminho in caminhos:
+        if os.path.exists(caminho):
+            estado = os.stat(caminho)
+            itens.append((caminho, estado.st_mtime_ns, estado.st_size))
+    return tuple(itens)
+
+def _ler_com_pandas(tabela):
+    import pandas as pd
+    with closing(consultas.conectar()) as conn:
+        df = particoes.ler_tabela(tabela, conn)
+    coluna_data, _ = particoes.TABELAS_PARTICIONADAS[tabela]
+    df[coluna_data] = pd.to_datetime(df[coluna_data])
+    return df
+
+def carregar_tabela_duckdb(conn, tabela, fonte):
+    """
+    Cria a tabela na conexão DuckDB a partir da fonte indicada por escolher_fonte.
+    Tabelas ainda dentro do .db passam pelo sqlite3 do Python: a extensão sqlite do DuckDB
+    precisaria ser baixada na primeira execução, o que não é garantido no servidor.
+    """
+    if fonte == 'parquet':
+        conn.read_parquet(caminho_parquet(tabela)).create(tabela)
+    elif fonte == 'particoes':
+        # Tipos do esquema gravado junto das partições: o CNPJ, por exemplo, não pode virar número
+        tipos = {coluna: TIPOS_DUCKDB.get(tipo, 'VARCHAR') for coluna, tipo in particoes.ler_esquema(tabela)}
+        conn.read_csv(os.path.join(particoes.PASTA_PARTICOES, tabela, '*.csv.gz'), header=True, dtype=tipos).create(tabela)
+    elif fonte == 'sqlite':
+        conn.from_df(_ler_com_pandas(tabela)).create(tabela)
+
+def _carregar_duckdb():
+    """
+    Monta o banco DuckDB em memória com as tabelas analíticas e os segmentos.
+    """
+    import duckdb
+    conn = duckdb.connect(':memory:')
+    tabelas_no_banco = _tabelas_no_banco()
+    for tabela in TABELAS_ANALITICAS:
+        carregar_tabela_duckdb(conn, tabela, escolher_fonte(tabela, tabelas_no_banco))
+    conn.from_df(carregar_segmentos()).create('segmentos')
+    return conn
+
+def _carregar_pandas():
+    tabelas = {}
+    tabelas_no_banco = _tabelas_no_banco()
+    for tabela in TABELAS_ANALITICAS:
+        if escolher_fonte(tabela, tabelas_no_banco) is not None:
+            tabelas[tabela] = _ler_com_pandas(tabela)
+    tabelas['segmentos'] = carregar_segmentos()
+    return tabelas
+
+_banco = None   # (assinatura, conexão DuckDB ou {tabela: DataFrame})
+_trava_banco = threading.Lock()
+
+def _obter_banco(assinatura):
+    """
+    Retorna o banco analítico atual (um cursor DuckDB próprio da chamada, ou o dicionário de
+    DataFrames do pandas), recarregando-o quando algum arquivo de origem mudou.
+    """
+    global _banco
+    with _trava_banco:
+        if _banco is None or _banco[0] != assinatura:
+            _banco = (assinatura, _carregar_duckdb() if duckdb_disponivel() else _carregar_pandas())
+        banco = _banco[1]
+    return banco if isinstance(banco, dict) else banco.cursor()
+
+def _existe(banco, tabela):
+    if isinstance(banco, dict):
+        return tabela in banco
+    return banco.execute("SELECT count(*) FROM information_schema.tables WHERE table_name = ?", (tabela,)).fetchone()[0] > 0
+
+# --- AGREGAÇÕES POR SEGMENTO E PERÍODO ---
+# Os resultados são cacheados junto com a assinatura dos arquivos de origem: qualquer
+# atualização dos dados (inclusive dos segmentos) gera novas chaves.
+def pvp_por_segmento(resolucao, periodo, estatistica, data_inicial):
+    """
+    Agrega o P/VP das séries semanais ou mensais do pipeline por segmento e período
+    (chaves de PERIODOS e ESTATISTICAS) a partir de data_inicial.
+    Retorna as colunas 'segmento', 'periodo', 'valor' e 'fundos' (fundos com dados no período).
+    Levanta consultas.DadosInsuficientes se as séries ainda não tiverem sido geradas.
+    """
+    return _pvp_por_segmento(_assinatura(), resolucao, periodo, estatistica, data_inicial)
+
+def variacao_vpa_por_segmento(periodo, estatistica, data_inicial):
+    """
+    Agrega, por segmento e período, a variação do VPA de cada fundo em relação ao período
+    anterior (último VPA informado em cada período), a partir de data_inicial.
+    Retorna as colunas 'segmento', 'periodo', 'valor' e 'fundos'.
+    """
+    return _variacao_vpa_por_segmento(_assinatura(), periodo, estatistica, data_inicial)
+
+@cache_com_validade(max_itens=64)
+def _pvp_por_segmento(assinatura, resolucao, periodo, estatistica, data_inicial):
+    import pandas as pd
+    tabela = consultas.TABELAS_AGREGADAS[resolucao]
+    banco = _obter_banco(assinatura)
+    if not _existe(banco, tabela):
+        raise consultas.DadosInsuficientes("As séries agregadas de P/VP ainda não foram geradas pelo pipeline (scripts/carrega_dados_precos.py).")
+    unidade, frequencia = PERIODOS[periodo]
+    expressao, agregacao = ESTATISTICAS[estatistica]
+
+    if isinstance(banco, dict):
+        df = banco[tabela].merge(banco['segmentos'][['ticker', 'segmento']], on='ticker')
+        df = df[(df['data'] >= pd.Timestamp(data_inicial)) & (df['pvp'] > 0)]
+        grupos = df.groupby(['segmento', df['data'].dt.to_period(frequencia).dt.start_time.rename('periodo')])
+        df_resultado = grupos.agg(valor=('pvp', agregacao), fundos=('ticker', 'nunique')).reset_index()
+    else:
+        df_resultado = banco.execute(f"""
+            SELECT s.segmento, date_trunc($unidade, p.data) AS periodo,
+                   {expressao.format(coluna='p.pvp')} AS valor, count(DISTINCT p.ticker) AS fundos
+            FROM {tabela} p JOIN segmentos s ON s.ticker = p.ticker
+            WHERE p.data >= $inicio AND p.pvp > 0
+            GROUP BY ALL
+        """, {'unidade': unidade, 'inicio': pd.Timestamp(data_inicial)}).df()
+    return _ordenar(df_resultado)
+
+@cache_com_validade(max_itens=64)
+def _variacao_vpa_por_segmento(assinatura, periodo, estatistica, data_inicial):
+    import pandas as pd
+    banco = _obter_banco(assinatura)
+    if not _existe(banco, 'vpa_historico'):
+        raise consultas.DadosInsuficientes("O histórico de VPA ainda não foi gerado pelo pipeline (scripts/carrega_dados_vpa.py).")
+    unidade, frequencia = PERIODOS[periodo]
+    expressao, agregacao = ESTATISTICAS[estatistica]
+
+    if isinstance(banco, dict):
+        df = banco['vpa_historico']
+        df = df[df['vpa'] > 0].sort_values(['cnpj', 'data_comptc'])
+        df = df.assign(periodo=df['data_comptc'].dt.to_period(frequencia).dt.start_time)
+        df = df.groupby(['cnpj', 'periodo'], as_index=False)['vpa'].last()
+        df['variacao'] = df['vpa'] / df.groupby('cnpj')['vpa'].shift() - 1
+        df = df.dropna(subset=['variacao'])
+        df = df[df['periodo'] >= pd.Timestamp(data_inicial)]
+        df = df.merge(banco['segmentos'][['cnpj', 'segmento']].drop_duplicates(), on='cnpj')
+        grupos = df.groupby(['segmento', 'periodo'])
+        df_resultado = grupos.agg(valor=('variacao', agregacao), fundos=('cnpj', 'nunique')).reset_index()
+    else:
+        df_resultado = banco.execute(f"""
+            WITH por_periodo AS (
+                SELECT cnpj, date_trunc($unidade, data_comptc) AS periodo, arg_max(vpa, data_comptc) AS vpa
+                FROM vpa_historico WHERE vpa > 0
+                GROUP BY ALL
+            ), variacoes AS (
+                SELECT cnpj, periodo, vpa / lag(vpa) OVER (PARTITION BY cnpj ORDER BY periodo) - 1 AS variacao
+                FROM por_periodo
+            )
+            SELECT s.segmento, v.periodo, {expressao.format(coluna='v.variacao')} AS valor, count(DISTINCT v.cnpj) AS fundos
+            FROM variacoes v JOIN (SELECT DISTINCT cnpj, segmento FROM segmentos) s ON s.cnpj = v.cnpj
+            WHERE v.variacao IS NOT NULL AND v.periodo >= $inicio
+            GROUP BY ALL
+        """, {'unidade': unidade, 'inicio': pd.Timestamp(data_inicial)}).df()
+    return _ordenar(df_resultado)
+
+def _ordenar(df_resultado):
+    import pandas as pd
+    df_resultado['periodo'] = pd.to_datetime(df_resultado['periodo'])
+    df_resultado['fundos'] = df_resultado['fundos'].astype('int64')
+    return df_resultado.sort_values(['periodo', 'segmento'], ignore_index=True)[['segmento', 'periodo', 'valor', 'fundos']]
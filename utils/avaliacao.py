@@ -0,0 +1,88 @@
+from datetime import date
+
+import pandas as pd
+
+from utils import consultas
+
+# Colunas da planilha de negociação da B3
+COLUNA_DATA = 'Data do Negócio'
+COLUNA_TICKER = 'Código de Negociação'
+COLUNA_QUANTIDADE = 'Quantidade'
+COLUNA_PRECO = 'Preço'
+
+def calcular_pvp_nas_compras(df_negociacoes):
+    """
+    Calcula o P/VP pago em cada compra: o preço da negociação dividido pelo VPA mais
+    recente do fundo naquela data. Todas as compras são avaliadas num único merge_asof
+    agrupado por CNPJ. Compras de ativos que não são FIIs cadastrados ficam com P/VP vazio.
+    """
+    df_compras = pd.DataFrame({
+        'data': pd.to_datetime(df_negociacoes[COLUNA_DATA], format='%d/%m/%Y'),
+        'ticker': df_negociacoes[COLUNA_TICKER],
+        'quantidade': pd.to_numeric(df_negociacoes[COLUNA_QUANTIDADE], errors='coerce'),
+        'preco': df_negociacoes[COLUNA_PRECO].astype(float),
+    })
+
+    df_cadastro = consultas.carregar_cadastro()
+    df_compras = df_compras.merge(df_cadastro[['ticker', 'cnpj']], on='ticker', how='left')
+    cnpjs = tuple(sorted(df_compras['cnpj'].dropna().unique()))
+    if not cnpjs:
+        return df_compras.assign(vpa=float('nan'), pvp=float('nan'))
+
+    df_vpa = consultas.carregar_vpa_fundos(cnpjs)
+    df_avaliado = pd.merge_asof(
+        df_compras.sort_values('data'), df_vpa,
+        on='data', by='cnpj', direction='backward'
+    )
+    df_avaliado['pvp'] = df_avaliado['preco'] / df_avaliado['vpa']
+    return df_avaliado
+
+def resumir_pvp_pago(df_avaliado):
+    """
+    A partir das compras avaliadas, retorna:
+    - um DataFrame por fundo com o P/VP médio pago, ponderado pela quantidade de cotas;
+    - o P/VP médio da carteira de FIIs, ponderado pelo valor investido em cada compra
+      (a quantidade sozinha não é comparável entre fundos com cotas de preços diferentes).
+    """
+    df_valido = df_avaliado.dropna(subset=['pvp', 'quantidade'])
+    if df_valido.empty:
+        return pd.DataFrame(columns=['ticker', 'quantidade', 'valor_investido', 'pvp_medio_pago']), None
+
+    df_pesos = df_valido.assign(
+        valor_investido=df_valido['quantidade'] * df_valido['preco'],
+        pvp_x_quantidade=df_valido['quantidade'] * df_valido['pvp'],
+        pvp_x_valor=df_valido['quantidade'] * df_valido['preco'] * df_valido['pvp'],
+    )
+    df_por_fundo = df_pesos.groupby('ticker', as_index=False)[['quantidade', 'valor_investido', 'pvp_x_quantidade']].sum()
+    df_por_fundo['pvp_medio_pago'] = df_por_fundo['pvp_x_quantidade'] / df_por_fundo['quantidade']
+    df_por_fundo = df_por_fundo.drop(columns='pvp_x_quantidade').sort_values('pvp_medio_pago').reset_index(drop=True)
+
+    pvp_carteira = df_pesos['pvp_x_valor'].sum() / df_pesos['valor_investido'].sum()
+    return df_por_fundo, pvp_carteira
+
+def calcular_retorno_das_compras(df_negociacoes, ticker):
+    """
+    Avalia cada compra do ticker pelo retorno até o último fechamento disponível, só pela
+    variação do preço e pelo retorno total (proventos recebidos depois da compra reinvestidos).
+    Compras feitas na data-ex não recebem aquele provento, como na B3.
+    O retorno total fica vazio se o pipeline ainda não tiver gravado os proventos.
+    """
+    df_compras = pd.DataFrame({
+        'data': pd.to_datetime(df_negociacoes[COLUNA_DATA], format='%d/%m/%Y'),
+        'quantidade': pd.to_numeric(df_negociacoes[COLUNA_QUANTIDADE], errors='coerce'),
+        'preco': df_negociacoes[COLUNA_PRECO].astype(float),
+    }).sort_values('data', ignore_index=True)
+
+    df_precos = consultas.baixar_precos(ticker.upper(), df_compras['data'].min().date(), date.today())
+    df_serie = df_precos.assign(retorno_total=consultas.calcular_retorno_total(df_precos, ticker))
+    df_serie['data'] = df_serie['data'].astype(df_compras['data'].dtype)
+    ultimo = df_serie.iloc[-1]
+    df_avaliado = pd.merge_asof(
+        df_compras, df_serie.rename(columns={'preco_fechamento': 'fechamento_compra', 'retorno_total': 'retorno_total_compra'}),
+        on='data', direction='backward'
+    )
+    df_avaliado['retorno_preco'] = ultimo['preco_fechamento'] / df_avaliado['preco'] - 1
+    # As cotas se multiplicam pelo crescimento do fator de proventos desde o dia da compra
+    cotas_reinvestidas = (ultimo['retorno_total'] / ultimo['preco_fechamento']) / (df_avaliado['retorno_total_compra'] / df_avaliado['fechamento_compra'])
+    df_avaliado['retorno_total'] = ultimo['preco_fechamento'] * cotas_reinvestidas / df_avaliado['preco'] - 1
+    return df_avaliado[['data', 'quantidade', 'preco', 'retorno_preco', 'retorno_total']]
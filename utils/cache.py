@@ -0,0 +1,113 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+def estimar_bytes(valor):
+    """
+    Estima a memória ocupada por um valor em cache: DataFrames e arrays pelo tamanho
+    real dos dados, figuras Plotly pelos arrays dos traços e coleções somando os itens.
+    """
+    if hasattr(valor, 'memory_usage'):   # DataFrame e Series do pandas
+        uso = valor.memory_usage(deep=True)
+        return int(uso.sum()) if hasattr(uso, 'sum') else int(uso)
+    if hasattr(valor, 'nbytes'):         # arrays do numpy
+        return int(valor.nbytes)
+    if hasattr(valor, 'to_plotly_json'):
+        return estimar_bytes(valor.to_plotly_json())
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(estimar_bytes(item) for item in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(estimar_bytes(item) for item in valor)
+    return sys.getsizeof(valor)
+
+class CacheComValidade:
+    """
+    Cache LRU em memória, seguro para uso entre threads, com tempo de validade por item.
+    É compartilhado pelas páginas do Streamlit e pela API HTTP, para que ambas
+    reaproveitem as mesmas consultas já feitas no processo.
+    Com max_bytes, os itens menos usados também são descartados quando o tamanho
+    estimado do que está em cache (estimar_bytes) passa desse limite.
+    """
+
+    def __init__(self, funcao, ttl_segundos=None, max_itens=128, max_bytes=None):
+        self.funcao = funcao
+        self.ttl_segundos = ttl_segundos
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self._itens = OrderedDict()   # chave: (expira_em, valor, bytes)
+        self._bytes = 0
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def __call__(self, *args, **kwargs):
+        chave = (args, tuple(sorted(kwargs.items())))
+        agora = time.monotonic()
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None and (item[0] is None or item[0] > agora):
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return item[1]
+            self.falhas += 1
+
+        # A função é executada fora da trava para não serializar consultas independentes
+        valor = self.funcao(*args, **kwargs)
+        expira_em = agora + self.ttl_segundos if self.ttl_segundos else None
+        tamanho = estimar_bytes(valor) if self.max_bytes else 0
+        with self._trava:
+            self._remover(chave)
+            self._itens[chave] = (expira_em, valor, tamanho)
+            self._bytes += tamanho
+            # O item recém-calculado fica mesmo que sozinho passe do limite de bytes
+            while len(self._itens) > self.max_itens or (self.max_bytes and self._bytes > self.max_bytes and len(self._itens) > 1):
+                self._bytes -= self._itens.popitem(last=False)[1][2]
+        return valor
+
+    def _remover(self, chave):
+        item = self._itens.pop(chave, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self._bytes = 0
+
+    def invalidar(self, predicado, expirando_em=None):
+        """
+        Remove apenas os itens cujos argumentos posicionais satisfazem o predicado.
+        Com expirando_em (segundos), só os que venceriam dentro desse prazo, o que permite
+        renovar os itens antes que eles expirem.
+        Retorna a lista dos argumentos posicionais removidos, para quem quiser recarregá-los.
+        """
+        limite = time.monotonic() + expirando_em if expirando_em is not None else None
+        with self._trava:
+            chaves = [chave for chave, (expira_em, _, _) in self._itens.items() if predicado(*chave[0])
+                      and (limite is None or (expira_em is not None and expira_em <= limite))]
+            for chave in chaves:
+                self._remover(chave)
+        return [chave[0] for chave in chaves]
+
+    def bytes_de(self, predicado):
+        """
+        Soma o tamanho estimado dos itens cujos argumentos posicionais satisfazem o predicado
+        (só é medido quando o cache tem max_bytes).
+        """
+        with self._trava:
+            return sum(item[2] for chave, item in self._itens.items() if predicado(*chave[0]))
+
+    def estatisticas(self):
+        with self._trava:
+            return {'itens': len(self._itens), 'bytes': self._bytes, 'acertos': self.acertos, 'falhas': self.falhas}
+
+def cache_com_validade(ttl_segundos=None, max_itens=128, max_bytes=None):
+    """
+    Decorador que aplica o CacheComValidade a uma função.
+    Os valores retornados são compartilhados: quem os recebe não deve modificá-los.
+    """
+    def decorador(funcao):
+        return wraps(funcao)(CacheComValidade(funcao, ttl_segundos, max_itens, max_bytes))
+    return decorador
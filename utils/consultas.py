@@ -0,0 +1,446 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import date
+
+from utils import particoes
+from utils.cache import cache_com_validade
+
+# pandas e o provedor de cotações são importados dentro das funções que os usam: a primeira
+# renderização das páginas só precisa da lista de tickers, lida direto do SQLite.
+
+# --- CAMADA DE CONSULTA COMPARTILHADA (páginas do Streamlit e API HTTP) ---
+PASTA_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMINHO_BANCO = os.path.join(PASTA_PROJETO, 'database', 'dados_fii.db')
+TTL_PRECOS_SEGUNDOS = 60 * 60
+MAX_BYTES_PRECOS = 32 * 1024 * 1024
+
+# Janelas mais longas que estes limites (em anos) leem as séries pré-agregadas pelo pipeline
+LIMITE_ANOS_DIARIO = 5
+LIMITE_ANOS_SEMANAL = 10
+TABELAS_AGREGADAS = {'semanal': 'pvp_semanal', 'mensal': 'pvp_mensal'}
+
+class ErroConsulta(Exception):
+    """Falha ao obter os dados pedidos (ticker inexistente, download de preços etc.)."""
+
+class TickerNaoEncontrado(ErroConsulta):
+    """O ticker pedido não está na tabela de cadastro."""
+
+class DadosInsuficientes(ErroConsulta):
+    """Os dados existem, mas não são suficientes para calcular o que foi pedido."""
+
+def conectar(com_particoes=True, tabelas=None):
+    """
+    Abre o banco SQLite somente para leitura, com as tabelas particionadas anexadas
+    (utils/particoes.py). 'tabelas' são as tabelas particionadas que a consulta usa:
+    só elas são sincronizadas com os arquivos antes (todas, se None). Consultas que só
+    usam tabelas pequenas do banco principal podem dispensar as partições.
+    """
+    conn = sqlite3.connect(f'file:{CAMINHO_BANCO}?mode=ro', uri=True)
+    if com_particoes:
+        particoes.anexar_particoes(conn, tabelas)
+    return conn
+
+@cache_com_validade(max_itens=1)
+def listar_tickers():
+    """
+    Retorna a lista ordenada de tickers cadastrados, sem depender do pandas.
+    """
+    with closing(conectar(com_particoes=False)) as conn:
+        return [linha[0] for linha in conn.execute("SELECT DISTINCT ticker FROM cadastro_fiis ORDER BY ticker")]
+
+@cache_com_validade(max_itens=1)
+def carregar_cadastro():
+    """
+    Carrega a tabela de cadastro (ticker -> CNPJ) dos FIIs.
+    """
+    import pandas as pd
+    with closing(conectar(com_particoes=False)) as conn:
+        return pd.read_sql_query("SELECT * FROM cadastro_fiis", conn)
+
+def buscar_cnpj(ticker):
+    """
+    Retorna o CNPJ de um ticker ou levanta ErroConsulta se ele não estiver cadastrado.
+    """
+    ticker_upper = ticker.upper()
+    df_cadastro = carregar_cadastro()
+    df_fii_selecionado = df_cadastro[df_cadastro['ticker'] == ticker_upper]
+    if df_fii_selecionado.empty:
+        raise TickerNaoEncontrado(f"Ticker '{ticker_upper}' não encontrado na sua tabela de cadastro.")
+    return df_fii_selecionado['cnpj'].iloc[0]
+
+@cache_com_validade(max_itens=512)
+def carregar_vpa_fundo(cnpj, data_inicial=None):
+    """
+    Carrega o histórico de VPA de um único fundo, ordenado por data.
+    Com data_inicial, o filtro é feito no próprio SQL e inclui o último VPA anterior
+    a essa data, necessário para o merge_asof do primeiro preço da janela.
+    """
+    import pandas as pd
+    with closing(conectar(tabelas=('vpa_historico',))) as conn:
+        if data_inicial is None:
+            df_vpa = pd.read_sql_query(
+                "SELECT data_comptc AS data, vpa FROM vpa_historico WHERE cnpj = ? ORDER BY data_comptc",
+                conn, params=(cnpj,)
+            )
+        else:
+            inicio = data_inicial.strftime('%Y-%m-%d')
+            df_vpa = pd.read_sql_query(
+                """
+                SELECT data_comptc AS data, vpa FROM vpa_historico
+                WHERE cnpj = ? AND data_comptc >= COALESCE(
+                    (SELECT MAX(data_comptc) FROM vpa_historico WHERE cnpj = ? AND data_comptc <= ?), ?
+                )
+                ORDER BY data_comptc
+                """,
+                conn, params=(cnpj, cnpj, inicio, inicio)
+            )
+    df_vpa['data'] = pd.to_datetime(df_vpa['data'])
+    return df_vpa
+
+@cache_com_validade(max_itens=64)
+def carregar_vpa_fundos(cnpjs):
+    """
+    Carrega numa única consulta o histórico de VPA de vários fundos (tupla de CNPJs),
+    com as colunas 'cnpj', 'data' e 'vpa', ordenado por data.
+    """
+    import pandas as pd
+    marcadores = ','.join('?' * len(cnpjs))
+    with closing(conectar(tabelas=('vpa_historico',))) as conn:
+        df_vpa = pd.read_sql_query(
+            f"SELECT cnpj, data_comptc AS data, vpa FROM vpa_historico WHERE cnpj IN ({marcadores}) ORDER BY data_comptc",
+            conn, params=tuple(cnpjs)
+        )
+    df_vpa['data'] = pd.to_datetime(df_vpa['data'])
+    return df_vpa
+
+def escolher_resolucao(janela_anos):
+    """
+    Define a granularidade da série conforme o tamanho da janela: 'diaria', 'semanal' ou 'mensal'.
+    """
+    if janela_anos <= LIMITE_ANOS_DIARIO:
+        return 'diaria'
+    if janela_anos <= LIMITE_ANOS_SEMANAL:
+        return 'semanal'
+    return 'mensal'
+
+@cache_com_validade(max_itens=512)
+def carregar_pvp_agregado(ticker, resolucao, data_inicial):
+    """
+    Lê a série semanal ou mensal de preço, VPA e P/VP já calculada pelo pipeline
+    (scripts/carrega_dados_precos.py). Retorna None se a tabela ainda não existir.
+    """
+    import pandas as pd
+    tabela = TABELAS_AGREGADAS[resolucao]
+    try:
+        with closing(conectar(tabelas=(tabela,))) as conn:
+            df_agregado = pd.read_sql_query(
+                f"SELECT * FROM {tabela} WHERE ticker = ? AND data >= ? ORDER BY data",
+                conn, params=(ticker, data_inicial.strftime('%Y-%m-%d'))
+            )
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return None
+    if 'zscore' not in df_agregado.columns:
+        # Tabela gerada por uma versão anterior do pipeline, sem as estatísticas móveis
+        return None
+    df_agregado = df_agregado.drop(columns='ticker').rename(columns={'pvp': 'P/VP'})
+    df_agregado['data'] = pd.to_datetime(df_agregado['data'])
+    df_agregado['retorno_total'] = calcular_retorno_total(df_agregado, ticker)
+    df_agregado = df_agregado.drop(columns='fator_proventos', errors='ignore')
+    df_agregado.attrs['resolucao'] = resolucao
+    return df_agregado
+
+@cache_com_validade(max_itens=512)
+def carregar_proventos(ticker):
+    """
+    Lê os proventos de um ticker gravados pelo pipeline, com o fator de reinvestimento
+    acumulado ('data', 'provento', 'fator_acumulado'). Retorna None se a tabela ainda não existir.
+    """
+    import pandas as pd
+    try:
+        with closing(conectar(tabelas=('proventos',))) as conn:
+            df_proventos = pd.read_sql_query(
+                "SELECT data, provento, fator_acumulado FROM proventos WHERE ticker = ? ORDER BY data",
+                conn, params=(ticker,)
+            )
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return None
+    df_proventos['data'] = pd.to_datetime(df_proventos['data'])
+    return df_proventos
+
+def calcular_retorno_total(df_precos, ticker):
+    """
+    Retorna a série de retorno total (proventos reinvestidos) alinhada a df_precos, na escala
+    do preço: no primeiro dia vale o fechamento e, a partir daí, cresce também com os proventos.
+    Usa o fator acumulado já calculado pelo pipeline (coluna 'fator_proventos' das séries
+    agregadas ou tabela de proventos); sem ele, a série fica vazia (NaN).
+    """
+    import pandas as pd
+    if 'fator_proventos' in df_precos.columns:
+        fatores = df_precos['fator_proventos']
+    else:
+        df_fatores = carregar_proventos(ticker.upper())
+        if df_fatores is None or df_precos.empty:
+            return pd.Series(float('nan'), index=df_precos.index, name='retorno_total')
+        fatores = pd.merge_asof(
+            df_precos[['data']], df_fatores[['data', 'fator_acumulado']].astype({'data': df_precos['data'].dtype}),
+            on='data', direction='backward'
+        )['fator_acumulado'].fillna(1.0).set_axis(df_precos.index)
+    return (df_precos['preco_fechamento'] * fatores / fatores.iloc[0]).rename('retorno_total')
+
+@cache_com_validade(ttl_segundos=TTL_PRECOS_SEGUNDOS, max_itens=256, max_bytes=MAX_BYTES_PRECOS)
+def baixar_precos(ticker, data_inicial, data_final):
+    """
+    Baixa os preços de fechamento de um ticker da B3 no provedor de cotações configurado
+    (utils/provedores.py), com as colunas 'data' e 'preco_fechamento'.
+    As datas são do tipo date, para que chamadas no mesmo dia compartilhem o cache.
+    """
+    from utils import provedores
+    provedor = provedores.obter_provedor()
+    try:
+        serie = provedor.baixar_fechamento(ticker, data_inicial, data_final)
+    except provedores.ErroProvedor as e:
+        raise ErroConsulta(f"Falha ao baixar os dados de preço para {ticker.upper()}. Detalhe: {e}")
+    return serie.reset_index()
+
+@cache_com_validade(ttl_segundos=TTL_PRECOS_SEGUNDOS, max_itens=1)
+def baixar_ultimos_precos(tickers):
+    """
+    Baixa em lote o último preço de fechamento de vários tickers (tupla).
+    Retorna uma Series indexada pelo ticker.
+    """
+    import pandas as pd
+    from utils import provedores
+    data_inicial = (pd.Timestamp(date.today()) - pd.Timedelta(days=14)).date()
+    try:
+        df_fechamentos = provedores.obter_provedor().baixar_fechamentos(list(tickers), data_inicial)
+    except provedores.ErroProvedor as e:
+        raise ErroConsulta(f"Falha ao baixar os preços em lote. Detalhe: {e}")
+    return df_fechamentos.ffill().iloc[-1].dropna()
+
+def calcular_serie_pvp(ticker, janela_anos=5):
+    """
+    Combina os preços de mercado com o VPA mais recente disponível em cada data
+    e retorna o DataFrame com as colunas 'data', 'preco_fechamento', 'vpa', 'P/VP'
+    e as estatísticas móveis do P/VP (utils.estatisticas.COLUNAS_ESTATISTICAS), além da
+    série de retorno total ('retorno_total', ver calcular_retorno_total).
+    Janelas longas usam as séries semanais/mensais pré-agregadas, quando existirem;
+    a granularidade usada fica em df.attrs['resolucao']. O DataFrame não deve ser modificado.
+    """
+    import pandas as pd
+    from utils import estatisticas
+    ticker_upper = ticker.upper()
+    hoje = date.today()
+    data_inicial = (pd.Timestamp(hoje) - pd.DateOffset(years=janela_anos)).date()
+
+    resolucao = escolher_resolucao(janela_anos)
+    if resolucao != 'diaria':
+        df_agregado = carregar_pvp_agregado(ticker_upper, resolucao, data_inicial)
+        if df_agregado is not None and not df_agregado.empty:
+            return df_agregado
+
+    # Na série diária as estatísticas são calculadas na hora; baixa-se um trecho a mais
+    # antes da janela para que as bandas já estejam completas no primeiro dia exibido
+    data_contexto = (pd.Timestamp(data_inicial) - pd.DateOffset(years=estatisticas.JANELA_BANDAS_ANOS, months=1)).date()
+    cnpj_do_fii = buscar_cnpj(ticker_upper)
+    df_vp_do_fii = carregar_vpa_fundo(cnpj_do_fii, data_contexto)
+    if df_vp_do_fii.empty:
+        raise DadosInsuficientes(f"Não foram encontrados dados de VPA para {ticker_upper} no banco de dados.")
+
+    df_precos = baixar_precos(ticker_upper, data_contexto, hoje)
+
+    df_combinado = pd.merge_asof(df_precos.sort_values('data'), df_vp_do_fii, on='data', direction='backward').dropna()
+    df_combinado = df_combinado[df_combinado['vpa'] > 0]
+    if df_combinado.empty:
+        raise DadosInsuficientes("Não foi possível combinar os dados de preço e VPA para gerar o gráfico.")
+
+    df_combinado['P/VP'] = df_combinado['preco_fechamento'] / df_combinado['vpa']
+    df_combinado[estatisticas.COLUNAS_ESTATISTICAS] = estatisticas.calcular_estatisticas_moveis(
+        df_combinado, estatisticas.janela_em_pontos('diaria'), 'P/VP'
+    )
+    df_combinado = df_combinado[df_combinado['data'] >= pd.Timestamp(data_inicial)].reset_index(drop=True)
+    if df_combinado.empty:
+        raise DadosInsuficientes("Não há cotações dentro da janela escolhida para gerar o gráfico.")
+    df_combinado['retorno_total'] = calcular_retorno_total(df_combinado, ticker_upper)
+    df_combinado.attrs['resolucao'] = 'diaria'
+    return df_combinado
+
+@cache_com_validade(max_itens=1)
+def carregar_ultimo_vpa():
+    """
+    Retorna o VPA mais recente de cada fundo cadastrado, com o respectivo ticker.
+    """
+    import pandas as pd
+    with closing(conectar(tabelas=('vpa_historico',))) as conn:
+        return pd.read_sql_query(
+            """
+            SELECT c.ticker, c.cnpj, v.data_vpa, v.vpa
+            FROM cadastro_fiis c
+            JOIN (
+                -- No SQLite, as colunas simples acompanham a linha escolhida pelo MAX()
+                SELECT cnpj, MAX(data_comptc) AS data_vpa, vpa FROM vpa_historico GROUP BY cnpj
+            ) v ON v.cnpj = c.cnpj
+            ORDER BY c.ticker
+            """,
+            conn
+        )
+
+@cache_com_validade(max_itens=1)
+def carregar_ultimas_estatisticas():
+    """
+    Retorna, por ticker, a média e o desvio móveis do P/VP no último ponto da série semanal.
+    Retorna um DataFrame vazio se a tabela ainda não tiver sido gerada.
+    """
+    import pandas as pd
+    try:
+        with closing(conectar(tabelas=('pvp_semanal',))) as conn:
+            return pd.read_sql_query(
+                """
+                SELECT ticker, MAX(data) AS data, media_movel, desvio_movel, banda_inferior, banda_superior
+                FROM pvp_semanal GROUP BY ticker
+                """,
+                conn
+            ).drop(columns='data')
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return pd.DataFrame(columns=['ticker', 'media_movel', 'desvio_movel', 'banda_inferior', 'banda_superior'])
+
+def filtrar_fundos(pvp_min=None, pvp_max=None):
+    """
+    Screener: calcula o P/VP atual de todos os fundos cadastrados e filtra pela faixa pedida.
+    Inclui o z-score do P/VP atual em relação às estatísticas móveis já materializadas.
+    """
+    df_ultimo_vpa = carregar_ultimo_vpa()
+    ultimos_precos = baixar_ultimos_precos(tuple(df_ultimo_vpa['ticker']))
+
+    df_screener = df_ultimo_vpa.assign(preco_fechamento=df_ultimo_vpa['ticker'].map(ultimos_precos)).dropna(subset=['preco_fechamento'])
+    df_screener['P/VP'] = df_screener['preco_fechamento'] / df_screener['vpa']
+    df_screener = df_screener.merge(carregar_ultimas_estatisticas(), on='ticker', how='left')
+    df_screener['zscore'] = (df_screener['P/VP'] - df_screener['media_movel']) / df_screener['desvio_movel']
+    if pvp_min is not None:
+        df_screener = df_screener[df_screener['P/VP'] >= pvp_min]
+    if pvp_max is not None:
+        df_screener = df_screener[df_screener['P/VP'] <= pvp_max]
+    return df_screener.sort_values('P/VP').reset_index(drop=True)
+
+_modulos_aquecidos = set()
+_trava_aquecimento = threading.Lock()
+
+def aquecer_em_segundo_plano(modulos=('pandas', 'yfinance')):
+    """
+    Depois da primeira renderização, importa os módulos pesados e carrega o cadastro
+    numa thread em segundo plano, para que o primeiro clique do usuário já encontre
+    tudo pronto. Cada módulo é aquecido uma única vez por processo.
+    """
+    with _trava_aquecimento:
+        pendentes = [modulo for modulo in modulos if modulo not in _modulos_aquecidos]
+        if not pendentes:
+            return
+        _modulos_aquecidos.update(pendentes)
+
+    def aquecer():
+        import importlib
+        for modulo in pendentes:
+            try:
+                importlib.import_module(modulo)
+            except Exception as e:
+                # Desmarcado para ser tentado de novo no próximo aquecimento (ou importado no primeiro uso)
+                print(f"Aquecimento de '{modulo}' falhou: {e}")
+                with _trava_aquecimento:
+                    _modulos_aquecidos.discard(modulo)
+        try:
+            carregar_cadastro()
+            # Sincroniza as partições com o banco local antes da primeira consulta que as usa
+            with closing(conectar()):
+                pass
+        except Exception as e:
+            print(f"Aquecimento em segundo plano falhou: {e}")
+
+    threading.Thread(target=aquecer, name='aquecimento-consultas', daemon=True).start()
+
+# --- VERSÃO DOS DADOS: invalidação seletiva quando o pipeline publica dados novos ---
+_versao_conhecida = None
+_assinatura_banco = None
+_trava_versao = threading.Lock()
+_ouvintes_alteracao = []
+
+def ao_alterar_dados(funcao):
+    """
+    Registra uma função chamada com o conjunto de tickers afetados sempre que uma
+    nova versão dos dados é aplicada. Usado pelos caches derivados (figuras, API).
+    """
+    _ouvintes_alteracao.append(funcao)
+    return funcao
+
+def _ler_versoes(desde):
+    """
+    Retorna as linhas (versao, escopo, alterados) publicadas depois da versão dada.
+    Bancos gerados antes do registro de versões não têm a tabela: equivalem à versão 0.
+    """
+    import json
+    try:
+        with closing(conectar(com_particoes=False)) as conn:
+            linhas = conn.execute(
+                "SELECT versao, escopo, alterados FROM versao_dados WHERE versao > ? ORDER BY versao",
+                (desde,)
+            ).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    return [(versao, escopo, set(json.loads(alterados))) for versao, escopo, alterados in linhas]
+
+def _recarregar(pendentes):
+    for funcao, argumentos in pendentes:
+        try:
+            funcao(*argumentos)
+        except Exception as e:
+            print(f"Recarga de {funcao.__name__}{argumentos} falhou: {e}")
+
+def verificar_versao_dados():
+    """
+    Confere se o pipeline publicou uma nova versão dos dados e invalida apenas as entradas
+    de cache dos fundos alterados, recarregando-as em segundo plano.
+    É barata o bastante para ser chamada a cada execução de página ou requisição:
+    o banco só é consultado quando o arquivo mudou desde a última verificação.
+    Retorna o conjunto de tickers afetados.
+    """
+    global _versao_conhecida, _assinatura_banco
+    try:
+        estado = os.stat(CAMINHO_BANCO)
+    except OSError:
+        return set()
+    assinatura = (estado.st_mtime_ns, estado.st_size)
+
+    with _trava_versao:
+        if assinatura == _assinatura_banco:
+            return set()
+        _assinatura_banco = assinatura
+        versoes = _ler_versoes(_versao_conhecida or 0)
+        primeira_verificacao = _versao_conhecida is None
+        if versoes:
+            _versao_conhecida = versoes[-1][0]
+        elif primeira_verificacao:
+            _versao_conhecida = 0
+        if primeira_verificacao or not versoes:
+            # Na primeira verificação os caches do processo já nasceram com os dados atuais
+            return set()
+
+    cnpjs = set().union(*(alterados for _, escopo, alterados in versoes if escopo == 'vpa'))
+    tickers = set().union(*(alterados for _, escopo, alterados in versoes if escopo == 'precos'))
+    pendentes = []
+    if cnpjs:
+        pendentes += [(carregar_vpa_fundo, argumentos) for argumentos in carregar_vpa_fundo.invalidar(lambda cnpj, *_: cnpj in cnpjs)]
+        carregar_vpa_fundos.invalidar(lambda cnpjs_chave: not cnpjs.isdisjoint(cnpjs_chave))
+        carregar_ultimo_vpa.limpar()
+        df_cadastro = carregar_cadastro()
+        tickers |= set(df_cadastro.loc[df_cadastro['cnpj'].isin(cnpjs), 'ticker'])
+    if tickers:
+        pendentes += [(carregar_pvp_agregado, argumentos) for argumentos in carregar_pvp_agregado.invalidar(lambda ticker, *_: ticker in tickers)]
+        pendentes += [(carregar_proventos, argumentos) for argumentos in carregar_proventos.invalidar(lambda ticker: ticker in tickers)]
+        carregar_ultimas_estatisticas.limpar()
+    for ouvinte in _ouvintes_alteracao:
+        ouvinte(tickers)
+
+    print(f"Nova versão dos dados ({_versao_conhecida}): {len(tickers)} ticker(s) afetado(s).")
+    if pendentes:
+        threading.Thread(target=_recarregar, args=(pendentes,), name='recarga-versao', daemon=True).start()
+    return tickers
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# --- ESTATÍSTICAS MÓVEIS DO P/VP (médias, desvios, bandas e z-score) ---
+JANELA_BANDAS_ANOS = 1
+PONTOS_POR_ANO = {'diaria': 252, 'semanal': 52, 'mensal': 12}
+PERCENTIS_BANDAS = (0.10, 0.90)
+COLUNAS_ESTATISTICAS = ['media_movel', 'desvio_movel', 'banda_inferior', 'banda_superior', 'zscore']
+
+def janela_em_pontos(resolucao, janela_anos=JANELA_BANDAS_ANOS):
+    """
+    Converte a janela das bandas (em anos) para o número de pontos da série na resolução dada.
+    """
+    return int(round(PONTOS_POR_ANO[resolucao] * janela_anos))
+
+def _inicio_dos_grupos(grupos):
+    """
+    Para cada linha, a posição da primeira linha do seu grupo (grupos contíguos).
+    """
+    posicoes = np.arange(len(grupos))
+    if len(grupos) == 0:
+        return posicoes
+    mudou = np.r_[True, grupos[1:] != grupos[:-1]]
+    return np.maximum.accumulate(np.where(mudou, posicoes, 0))
+
+def calcular_estatisticas_moveis(df, janela, coluna='pvp', grupo=None):
+    """
+    Calcula média e desvio padrão móveis, bandas de percentis e z-score da coluna dada.
+    Média e desvio saem de somas acumuladas (O(n) para todos os grupos de uma vez);
+    os percentis usam o rolling quantile do pandas (O(n log janela)).
+    O DataFrame deve estar ordenado por (grupo, data), sem valores nulos ou infinitos na
+    coluna; as janelas nunca cruzam grupos.
+    Retorna um DataFrame com COLUNAS_ESTATISTICAS e o mesmo índice de df.
+    """
+    valores = df[coluna].to_numpy(dtype=float)
+    n = len(valores)
+    grupos = df[grupo].to_numpy() if grupo else np.zeros(n, dtype=int)
+
+    posicoes = np.arange(n)
+    inicio_grupo = _inicio_dos_grupos(grupos)
+    janela_completa = posicoes - janela + 1 >= inicio_grupo
+    # Posição anterior à janela; quando a janela começa no início do grupo, não há o que subtrair
+    anterior = posicoes - janela
+    tem_anterior = anterior >= inicio_grupo
+    anterior = np.maximum(anterior, 0)
+
+    # Cada grupo é centralizado na sua média e tem a sua própria soma acumulada,
+    # o que evita o erro numérico de subtrair totais grandes acumulados de outros grupos
+    serie = pd.Series(valores)
+    centro = serie.groupby(grupos, sort=False).transform('mean').to_numpy()
+    desvios = pd.Series(valores - centro)
+    soma = desvios.groupby(grupos, sort=False).cumsum().to_numpy()
+    soma_quadrados = (desvios * desvios).groupby(grupos, sort=False).cumsum().to_numpy()
+    soma_janela = soma - np.where(tem_anterior, soma[anterior], 0.0)
+    soma_quadrados_janela = soma_quadrados - np.where(tem_anterior, soma_quadrados[anterior], 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = soma_janela / janela + centro
+        variancia = (soma_quadrados_janela - soma_janela * soma_janela / janela) / (janela - 1)
+        # Variâncias residuais (erro de arredondamento das somas) são tratadas como zero
+        desvio = np.where(variancia > 1e-12 * media * media, np.sqrt(np.abs(variancia)), 0.0)
+        zscore = np.where(desvio > 0, (valores - media) / desvio, np.nan)
+    media[~janela_completa] = np.nan
+    desvio[~janela_completa] = np.nan
+    zscore[~janela_completa] = np.nan
+
+    rolante = serie.groupby(grupos, sort=False).rolling(janela, min_periods=janela) if grupo else serie.rolling(janela, min_periods=janela)
+    bandas = []
+    for percentil in PERCENTIS_BANDAS:
+        banda = rolante.quantile(percentil)
+        if grupo:
+            banda = banda.reset_index(level=0, drop=True).sort_index()
+        bandas.append(banda.to_numpy())
+
+    return pd.DataFrame({
+        'media_movel': media,
+        'desvio_movel': desvio,
+        'banda_inferior': bandas[0],
+        'banda_superior': bandas[1],
+        'zscore': zscore,
+    }, index=df.index)
+
+def atualizar_estatisticas(df_historico, df_novos, janela, coluna='pvp', grupo='ticker'):
+    """
+    Recalcula as estatísticas apenas da cauda nova da série.
+    De cada grupo do histórico só são usadas as últimas (janela - 1) linhas, como contexto.
+    Retorna df_novos com as COLUNAS_ESTATISTICAS preenchidas.
+    """
+    contexto = df_historico.sort_values([grupo, 'data']).groupby(grupo).tail(janela - 1)
+    df_combinado = pd.concat(
+        [contexto[[grupo, 'data', coluna]].assign(_novo=False), df_novos.assign(_novo=True)],
+        ignore_index=True
+    ).sort_values([grupo, 'data'], kind='stable', ignore_index=True)
+
+    df_estatisticas = calcular_estatisticas_moveis(df_combinado, janela, coluna, grupo)
+    df_combinado[COLUNAS_ESTATISTICAS] = df_estatisticas
+    return df_combinado[df_combinado['_novo']].drop(columns='_novo').reset_index(drop=True)
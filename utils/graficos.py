@@ -0,0 +1,102 @@
+from utils import consultas
+from utils.cache import cache_com_validade
+
+# --- FIGURAS PLOTLY DAS PÁGINAS (cacheadas junto com os dados que as originam) ---
+DESCRICAO_RESOLUCAO = {'diaria': 'diários', 'semanal': 'semanais', 'mensal': 'mensais'}
+MAX_BYTES_FIGURAS = 96 * 1024 * 1024
+
+@cache_com_validade(ttl_segundos=consultas.TTL_PRECOS_SEGUNDOS, max_itens=128, max_bytes=MAX_BYTES_FIGURAS)
+def montar_figuras_pvp(ticker, janela_anos=5):
+    """
+    Busca a série de P/VP e retorna DUAS figuras Plotly:
+    1. P/VP histórico.
+    2. Preço de Mercado vs. VPA.
+    Levanta consultas.ErroConsulta se os dados não puderem ser obtidos.
+    As figuras são compartilhadas entre sessões e não devem ser modificadas.
+    """
+    df_combinado = consultas.calcular_serie_pvp(ticker, janela_anos)
+
+    import plotly.graph_objects as go
+    
+    # --- GRÁFICO 1: P/VP Histórico, com média móvel e faixa de percentis ---
+    fig_pvp = go.Figure()
+    if df_combinado['banda_superior'].notna().any():
+        fig_pvp.add_trace(go.Scatter(
+            x=df_combinado['data'], y=df_combinado['banda_superior'], mode='lines',
+            line=dict(width=0), showlegend=False, hoverinfo='skip'
+        ))
+        fig_pvp.add_trace(go.Scatter(
+            x=df_combinado['data'], y=df_combinado['banda_inferior'], mode='lines',
+            line=dict(width=0), fill='tonexty', fillcolor='rgba(0, 100, 0, 0.12)',
+            name='Faixa P10–P90 (12 meses)', hoverinfo='skip'
+        ))
+        fig_pvp.add_trace(go.Scatter(
+            x=df_combinado['data'], y=df_combinado['media_movel'], mode='lines',
+            name='Média Móvel (12 meses)', line=dict(color='gray', dash='dot'),
+            hovertemplate='<b>Média móvel:</b> %{y:.2f}<extra></extra>'
+        ))
+    fig_pvp.add_trace(go.Scatter(
+        x=df_combinado['data'], y=df_combinado['P/VP'], mode='lines',
+        name='P/VP Histórico', line=dict(color='darkgreen'),
+        hovertemplate='<b>Data:</b> %{x|%d/%m/%Y}<br><b>P/VP:</b> %{y:.2f}<extra></extra>'
+    ))
+    fig_pvp.add_hline(y=1.0, line_width=2, line_dash="dash", line_color="red",
+                      annotation_text="P/VP = 1.0", annotation_position="bottom right")
+    media_pvp = df_combinado['P/VP'].mean()
+    resolucao = DESCRICAO_RESOLUCAO[df_combinado.attrs.get('resolucao', 'diaria')]
+    zscore_atual = df_combinado['zscore'].iloc[-1]
+    texto_zscore = f' · Z-score atual: {zscore_atual:+.2f}' if zscore_atual == zscore_atual else ''
+    fig_pvp.update_layout(
+        title=f'<b>Histórico de P/VP para {ticker.upper()}</b><br><sup>Média no período: {media_pvp:.2f}{texto_zscore} · Dados {resolucao}</sup>',
+        xaxis_title='Data', yaxis_title='Índice P/VP', template='plotly_white'
+    )
+
+    # --- GRÁFICO 2: Preço de Mercado vs. VPA (NOVO) ---
+    fig_preco_vpa = go.Figure()
+    fig_preco_vpa.add_trace(go.Scatter(
+        x=df_combinado['data'], y=df_combinado['preco_fechamento'], name='Preço de Mercado',
+        line=dict(color='royalblue'), hovertemplate='<b>Preço:</b> R$ %{y:,.2f}<extra></extra>'
+    ))
+    fig_preco_vpa.add_trace(go.Scatter(
+        x=df_combinado['data'], y=df_combinado['vpa'], name='Valor Patrimonial (VPA)',
+        line=dict(color='darkorange', dash='dot'), hovertemplate='<b>VPA:</b> R$ %{y:,.2f}<extra></extra>'
+    ))
+    # Retorno total: uma cota comprada no início da janela, com os proventos reinvestidos
+    texto_retorno = ''
+    retorno_total = df_combinado['retorno_total'].dropna()
+    if not retorno_total.empty:
+        fig_preco_vpa.add_trace(go.Scatter(
+            x=df_combinado['data'], y=df_combinado['retorno_total'], name='Retorno Total (proventos reinvestidos)',
+            line=dict(color='seagreen'), hovertemplate='<b>Retorno total:</b> R$ %{y:,.2f}<extra></extra>'
+        ))
+        precos = df_combinado['preco_fechamento']
+        texto_retorno = (f"<br><sup>No período: preço {precos.iloc[-1] / precos.iloc[0] - 1:+.1%}"
+                         f" · retorno total {retorno_total.iloc[-1] / retorno_total.iloc[0] - 1:+.1%}</sup>")
+    fig_preco_vpa.update_layout(
+        title=f'<b>Preço de Mercado vs. Valor Patrimonial para {ticker.upper()}</b>{texto_retorno}',
+        xaxis_title='Data', yaxis_title='Valor (R$)', template='plotly_white',
+        legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01)
+    )
+
+    return fig_pvp, fig_preco_vpa
+
+@consultas.ao_alterar_dados
+def _invalidar_figuras(tickers):
+    montar_figuras_pvp.invalidar(lambda ticker, *_: ticker in tickers)
+
+def montar_figura_segmentos(df_agregado, titulo, eixo_y, formato_valor):
+    """
+    Uma linha por segmento ao longo dos períodos (saída de utils.analitico).
+    formato_valor é o formato d3 do hover e do eixo (ex.: '.2f' ou '.1%').
+    """
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    for segmento, df_segmento in df_agregado.groupby('segmento', sort=True):
+        fig.add_trace(go.Scatter(
+            x=df_segmento['periodo'], y=df_segmento['valor'], mode='lines', name=segmento,
+            customdata=df_segmento['fundos'],
+            hovertemplate=f'<b>{segmento}</b><br>%{{x|%m/%Y}}: %{{y:{formato_valor}}} (%{{customdata}} fundos)<extra></extra>'
+        ))
+    fig.update_layout(title=f'<b>{titulo}</b>', xaxis_title='Período', yaxis_title=eixo_y,
+                      yaxis_tickformat=formato_valor, template='plotly_white')
+    return fig
@@ -0,0 +1,93 @@
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from utils.avaliacao import COLUNA_DATA, COLUNA_TICKER, COLUNA_QUANTIDADE, COLUNA_PRECO
+
+# --- LEITURA E MESCLA DAS PLANILHAS DE NEGOCIAÇÃO DA B3 ---
+COLUNA_MOVIMENTACAO = 'Tipo de Movimentação'
+COLUNA_INSTITUICAO = 'Instituição'
+# Uma mesma negociação exportada em duas planilhas (períodos sobrepostos) tem estes campos iguais
+CHAVE_NEGOCIACAO = [COLUNA_DATA, COLUNA_TICKER, COLUNA_QUANTIDADE, COLUNA_PRECO, COLUNA_INSTITUICAO]
+MAX_THREADS = 4
+
+class ErroPlanilha(Exception):
+    """A planilha enviada não é a de negociação da B3 ou não pôde ser lida."""
+
+class PlanilhaSemCompras(ErroPlanilha):
+    """A planilha é válida, mas não contém nenhuma operação de compra."""
+
+def calcular_hash(conteudo):
+    """
+    Identifica uma planilha pelo conteúdo, para que ela nunca seja lida duas vezes.
+    """
+    return hashlib.sha1(conteudo).hexdigest()
+
+def ler_planilha(conteudo):
+    """
+    Lê os bytes de uma planilha de negociação da B3 e retorna apenas as compras,
+    com preço numérico, data no formato dd/mm/aaaa e tickers padronizados.
+    """
+    try:
+        df = pd.read_excel(io.BytesIO(conteudo))
+    except Exception as e:
+        raise ErroPlanilha(f"Não foi possível processar a planilha. Verifique o arquivo. Erro: {e}")
+
+    if COLUNA_MOVIMENTACAO not in df.columns:
+        raise ErroPlanilha(f"A coluna '{COLUNA_MOVIMENTACAO}' não foi encontrada. Verifique se a planilha é a de 'Negociação' da B3.")
+
+    df_compras = df[df[COLUNA_MOVIMENTACAO] == 'Compra'].copy()
+    if df_compras.empty:
+        raise PlanilhaSemCompras("A planilha carregada não contém nenhuma operação de 'Compra'.")
+
+    df_compras[COLUNA_PRECO] = pd.to_numeric(df_compras[COLUNA_PRECO].astype(str).str.replace('R$', '', regex=False).str.strip().str.replace(',', '.', regex=False), errors='coerce')
+    df_compras.dropna(subset=[COLUNA_PRECO], inplace=True)
+
+    # Algumas exportações trazem a data já como data do Excel, e não como texto
+    if not pd.api.types.is_string_dtype(df_compras[COLUNA_DATA]):
+        df_compras[COLUNA_DATA] = pd.to_datetime(df_compras[COLUNA_DATA]).dt.strftime('%d/%m/%Y')
+
+    df_compras[COLUNA_TICKER] = df_compras[COLUNA_TICKER].astype(str).str.strip().str.upper().str.replace('F$', '', regex=True)
+    df_compras[COLUNA_TICKER] = df_compras[COLUNA_TICKER].str.replace('TRPL4', 'ISAE4', regex=True)
+    df_compras[COLUNA_TICKER] = df_compras[COLUNA_TICKER].str.replace('TRPL3', 'ISAE3', regex=True)
+    return df_compras
+
+def _ler_planilha_isolada(conteudo):
+    # O erro volta como valor para não interromper a leitura das demais planilhas
+    try:
+        return ler_planilha(conteudo)
+    except ErroPlanilha as e:
+        return e
+
+def ler_planilhas(conteudos):
+    """
+    Lê várias planilhas de uma vez. Recebe {hash: bytes} e retorna {hash: DataFrame ou ErroPlanilha}.
+    Threads, e não processos: as planilhas da B3 são pequenas, e criar processos a partir
+    do servidor do Streamlit (que tem várias threads) arriscaria travas herdadas no fork.
+    """
+    threads = min(len(conteudos), MAX_THREADS)
+    if threads <= 1:
+        return {chave: _ler_planilha_isolada(conteudo) for chave, conteudo in conteudos.items()}
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='leitura-planilhas') as executor:
+        resultados = executor.map(_ler_planilha_isolada, conteudos.values())
+        return dict(zip(conteudos.keys(), resultados))
+
+def mesclar_negociacoes(df_existente, df_novo):
+    """
+    Incorpora as compras de uma nova planilha às já carregadas, descartando as
+    negociações repetidas entre planilhas de períodos sobrepostos.
+    Negociações idênticas dentro de uma mesma planilha (duas ordens iguais no mesmo dia)
+    são preservadas: a n-ésima ocorrência de uma chave só é duplicata da n-ésima da outra.
+    """
+    if df_existente is None or df_existente.empty:
+        return df_novo.reset_index(drop=True)
+    chave = [coluna for coluna in CHAVE_NEGOCIACAO if coluna in df_existente.columns and coluna in df_novo.columns]
+    df_combinado = pd.concat([df_existente, df_novo], ignore_index=True)
+    ocorrencia = pd.concat([
+        df_existente.groupby(chave, dropna=False).cumcount(),
+        df_novo.groupby(chave, dropna=False).cumcount(),
+    ], ignore_index=True)
+    repetida = df_combinado[chave].assign(_ocorrencia=ocorrencia).duplicated()
+    return df_combinado[~repetida].reset_index(drop=True)
@@ -0,0 +1,226 @@
+import csv
+import gzip
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+# --- ARMAZENAMENTO PARTICIONADO POR ANO (históricos grandes fora do arquivo .db) ---
+# Cada tabela vira uma pasta com um arquivo CSV compactado por ano, ordenado e gerado de
+# forma determinística: anos fechados ficam byte a byte iguais entre execuções e só o
+# arquivo do ano corrente muda no commit diário. Para leitura, as partições são copiadas
+# para um banco SQLite local e indexado (database/cache, fora do git), anexado às conexões
+# do banco principal: cada tabela é sincronizada só quando uma consulta a usa, e só os
+# arquivos que mudaram desde a última sincronização são relidos.
+PASTA_PARTICOES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'particoes')
+ARQUIVO_ESQUEMA = '_esquema.sql'
+ESQUEMA_ANEXADO = 'particoes'
+ARQUIVO_CACHE = 'particoes.db'
+TABELA_CONTROLE = '_arquivos_sincronizados'
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'   # O mesmo texto que o DataFrame.to_sql grava no SQLite
+
+# tabela: (coluna de data usada para particionar, colunas de ordenação e do índice)
+TABELAS_PARTICIONADAS = {
+    'vpa_historico': ('data_comptc', ('cnpj', 'data_comptc')),
+    'pvp_semanal': ('data', ('ticker', 'data')),
+    'pvp_mensal': ('data', ('ticker', 'data')),
+    'proventos': ('data', ('ticker', 'data')),
+}
+
+def _escrever_se_mudou(caminho, conteudo):
+    """
+    Grava o arquivo só se o conteúdo mudou, preservando o mtime (e o git status) dos demais.
+    """
+    if os.path.exists(caminho):
+        with open(caminho, 'rb') as arquivo:
+            if arquivo.read() == conteudo:
+                return False
+    caminho_temporario = caminho + '.tmp'
+    with open(caminho_temporario, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(caminho_temporario, caminho)
+    return True
+
+def gravar_tabela(df, tabela, pasta=None):
+    """
+    Grava a tabela inteira como partições anuais (<pasta>/<tabela>/<ano>.csv.gz) e o
+    esquema SQLite correspondente. Partições de anos que sumiram são removidas.
+    Retorna a lista dos arquivos que de fato mudaram.
+    """
+    import pandas as pd
+    pasta = pasta or PASTA_PARTICOES
+    coluna_data, ordem = TABELAS_PARTICIONADAS[tabela]
+    pasta_tabela = os.path.join(pasta, tabela)
+    os.makedirs(pasta_tabela, exist_ok=True)
+
+    alterados = []
+    esquema = pd.io.sql.get_schema(df, tabela) + ';\n'
+    if _escrever_se_mudou(os.path.join(pasta_tabela, ARQUIVO_ESQUEMA), esquema.encode('utf-8')):
+        alterados.append(ARQUIVO_ESQUEMA)
+
+    df_ordenado = df.sort_values(list(ordem), kind='stable')
+    anos = pd.to_datetime(df_ordenado[coluna_data]).dt.year
+    nomes_gravados = set()
+    for ano, df_ano in df_ordenado.groupby(anos, sort=True):
+        texto = df_ano.to_csv(index=False, date_format=FORMATO_DATA, lineterminator='\n')
+        # mtime=0 e sem nome de arquivo no cabeçalho: o mesmo conteúdo gera os mesmos bytes
+        nome = f'{ano}.csv.gz'
+        nomes_gravados.add(nome)
+        if _escrever_se_mudou(os.path.join(pasta_tabela, nome), gzip.compress(texto.encode('utf-8'), compresslevel=9, mtime=0)):
+            alterados.append(nome)
+
+    for nome in os.listdir(pasta_tabela):
+        if nome.endswith('.csv.gz') and nome not in nomes_gravados:
+            os.remove(os.path.join(pasta_tabela, nome))
+            alterados.append(nome)
+    print(f"Partições de '{tabela}': {len(nomes_gravados)} arquivo(s), {len(alterados)} alterado(s).")
+    return [os.path.join(tabela, nome) for nome in alterados]
+
+def caminho_cache(pasta=None):
+    """
+    Banco SQLite local (fora do git) em que as partições são sincronizadas para leitura.
+    """
+    return os.path.join(os.path.dirname(pasta or PASTA_PARTICOES), 'cache', ARQUIVO_CACHE)
+
+def _estado_arquivos(pasta_tabela):
+    """
+    Retorna {arquivo: (mtime, tamanho)} do esquema e das partições de uma tabela.
+    """
+    if not os.path.isdir(pasta_tabela):
+        return {}
+    estados = {}
+    for entrada in os.scandir(pasta_tabela):
+        if entrada.name == ARQUIVO_ESQUEMA or entrada.name.endswith('.csv.gz'):
+            estado = entrada.stat()
+            estados[entrada.name] = (estado.st_mtime_ns, estado.st_size)
+    return estados
+
+def _inserir_particao(conn, caminho, tabela, conversores):
+    with gzip.open(caminho, 'rt', encoding='utf-8', newline='') as arquivo:
+        leitor = csv.reader(arquivo)
+        cabecalho = next(leitor)
+        marcadores = ','.join('?' * len(cabecalho))
+        colunas = ','.join(f'"{coluna}"' for coluna in cabecalho)
+        conn.executemany(f'INSERT INTO "{tabela}" ({colunas}) VALUES ({marcadores})', map(
+            lambda linha: [None if valor == '' else conversor(valor) for conversor, valor in zip(conversores, linha)],
+            leitor
+        ))
+
+def _sincronizar_tabela(conn, pasta, tabela, atuais):
+    """
+    Atualiza a tabela no banco local para refletir os arquivos atuais: só as partições
+    novas ou alteradas são relidas (e os anos removidos, apagados). Uma mudança de
+    esquema recria a tabela inteira.
+    """
+    coluna_data, ordem = TABELAS_PARTICIONADAS[tabela]
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Relido dentro da transação: outro processo pode ter acabado de sincronizar
+        registrados = {arquivo: (mtime, tamanho) for arquivo, mtime, tamanho in conn.execute(
+            f'SELECT arquivo, mtime_ns, tamanho FROM {TABELA_CONTROLE} WHERE tabela = ?', (tabela,)
+        )}
+        if registrados == atuais:
+            conn.execute('COMMIT')
+            return
+        if ARQUIVO_ESQUEMA not in atuais or registrados.get(ARQUIVO_ESQUEMA) != atuais[ARQUIVO_ESQUEMA]:
+            conn.execute(f'DROP TABLE IF EXISTS "{tabela}"')
+            conn.execute(f'DELETE FROM {TABELA_CONTROLE} WHERE tabela = ?', (tabela,))
+            registrados = {}
+            if ARQUIVO_ESQUEMA in atuais:
+                with open(os.path.join(pasta, tabela, ARQUIVO_ESQUEMA), encoding='utf-8') as arquivo:
+                    conn.execute(arquivo.read())
+                conn.execute(f'CREATE INDEX "idx_{tabela}_{"_".join(ordem)}" ON "{tabela}" ({", ".join(ordem)})')
+                registrados[ARQUIVO_ESQUEMA] = atuais[ARQUIVO_ESQUEMA]
+
+        if ARQUIVO_ESQUEMA in atuais:
+            # Os números são convertidos aqui, e não pela afinidade da coluna, para que a leitura
+            # devolva exatamente os mesmos floats que foram gravados
+            conversores = [float if tipo == 'REAL' else int if tipo == 'INTEGER' else str
+                           for _, _, tipo, *_ in conn.execute(f'PRAGMA table_info("{tabela}")')]
+            for nome in sorted(set(atuais) | set(registrados)):
+                if nome == ARQUIVO_ESQUEMA or atuais.get(nome) == registrados.get(nome):
+                    continue
+                ano = int(nome.split('.')[0])
+                conn.execute(f'DELETE FROM "{tabela}" WHERE {coluna_data} >= ? AND {coluna_data} < ?',
+                             (f'{ano}-01-01', f'{ano + 1}-01-01'))
+                if nome in atuais:
+                    _inserir_particao(conn, os.path.join(pasta, tabela, nome), tabela, conversores)
+        conn.execute(f'DELETE FROM {TABELA_CONTROLE} WHERE tabela = ?', (tabela,))
+        conn.executemany(f'INSERT INTO {TABELA_CONTROLE} VALUES (?, ?, ?, ?)',
+                         [(tabela, nome, mtime, tamanho) for nome, (mtime, tamanho) in atuais.items()])
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    alterados = sum(1 for nome in set(atuais) | set(registrados) if nome != ARQUIVO_ESQUEMA and registrados.get(nome) != atuais.get(nome))
+    print(f"Partições de '{tabela}' sincronizadas: {alterados} arquivo(s) alterado(s).")
+
+_sincronizados = {}   # (banco local, tabela): estado dos arquivos na última sincronização
+_trava_sincronizacao = threading.Lock()
+
+def sincronizar(tabelas=None, pasta=None):
+    """
+    Garante que o banco local reflete as partições das tabelas pedidas (todas, se None)
+    e retorna o caminho dele, ou None se não houver partições. Quando nada mudou, o custo
+    é o de listar as pastas das tabelas.
+    """
+    pasta = pasta or PASTA_PARTICOES
+    tabelas = TABELAS_PARTICIONADAS if tabelas is None else tabelas
+    caminho = caminho_cache(pasta)
+    estados = {tabela: _estado_arquivos(os.path.join(pasta, tabela)) for tabela in tabelas}
+    existe = os.path.exists(caminho)
+    pendentes = [tabela for tabela, atuais in estados.items() if not existe or _sincronizados.get((caminho, tabela)) != atuais]
+    if pendentes:
+        with _trava_sincronizacao:
+            if not existe and not any(estados.values()):
+                return None
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            with closing(sqlite3.connect(caminho, isolation_level=None, timeout=60)) as conn:
+                # WAL: as conexões do app continuam lendo enquanto outro processo sincroniza
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(f'CREATE TABLE IF NOT EXISTS {TABELA_CONTROLE} '
+                             '(tabela TEXT, arquivo TEXT, mtime_ns INTEGER, tamanho INTEGER)')
+                for tabela in pendentes:
+                    _sincronizar_tabela(conn, pasta, tabela, estados[tabela])
+                    _sincronizados[(caminho, tabela)] = estados[tabela]
+    return caminho if os.path.exists(caminho) else None
+
+def ler_esquema(tabela, pasta=None):
+    """
+    Retorna as colunas de uma tabela particionada e seus tipos SQLite, [(coluna, tipo)],
+    ou None se ela não tiver partições gravadas.
+    """
+    caminho = os.path.join(pasta or PASTA_PARTICOES, tabela, ARQUIVO_ESQUEMA)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo, closing(sqlite3.connect(':memory:')) as conn:
+        conn.executescript(arquivo.read())
+        return [(nome, tipo) for _, nome, tipo, *_ in conn.execute(f'PRAGMA table_info("{tabela}")')]
+
+def anexar_particoes(conn, tabelas=None, pasta=None):
+    """
+    Anexa as tabelas particionadas à conexão (aberta com uri=True), que passam a ser
+    consultadas pelo nome, como as demais. Só as tabelas pedidas (todas, se None) são
+    sincronizadas antes; as outras podem estar desatualizadas no banco anexado.
+    Tabelas que ainda existam no banco principal têm precedência, o que mantém
+    funcionando bancos gerados antes do particionamento.
+    """
+    caminho = sincronizar(tabelas, pasta)
+    if caminho is not None:
+        conn.execute(f"ATTACH DATABASE ? AS {ESQUEMA_ANEXADO}", (f'file:{caminho}?mode=ro',))
+    return conn
+
+def ler_tabela(tabela, conn, pasta=None):
+    """
+    Lê uma tabela inteira para um DataFrame, com a mesma precedência de anexar_particoes:
+    do banco principal, se ela ainda estiver lá, ou das partições.
+    Levanta pandas.errors.DatabaseError se não existir em nenhum dos dois.
+    """
+    import pandas as pd
+    pasta = pasta or PASTA_PARTICOES
+    no_banco = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,)).fetchone()
+    if no_banco is None and os.path.isdir(os.path.join(pasta, tabela)):
+        caminho = sincronizar((tabela,), pasta)
+        with closing(sqlite3.connect(f'file:{caminho}?mode=ro', uri=True)) as conn_local:
+            return pd.read_sql_query(f'SELECT * FROM "{tabela}"', conn_local)
+    return pd.read_sql_query(f'SELECT * FROM "{tabela}"', conn)
@@ -0,0 +1,121 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import consultas, graficos
+
+# --- PRÉ-AQUECIMENTO DO CACHE PARA OS TICKERS MAIS VISTOS ---
+TOP_N = 10
+INTERVALO_SEGUNDOS = 20 * 60      # Menor que o TTL dos preços, para o cache não esfriar
+LIMITE_CONCORRENCIA = 2           # Downloads simultâneos, para não competir com os usuários
+ORCAMENTO_MEMORIA_MB = 64
+JANELAS_PREAQUECIDAS = (5,)       # Janela padrão da página de P/VP
+MARGEM_RENOVACAO_SEGUNDOS = 5 * 60
+
+class PreAquecedor:
+    """
+    Conta quantas vezes cada ticker é pedido e, periodicamente, aquece em segundo plano
+    os dados e as figuras dos TOP_N mais pedidos, respeitando um limite de concorrência.
+    Os itens que venceriam antes do próximo ciclo são renovados, para que um ticker
+    popular não fique frio entre dois ciclos. O orçamento de memória é medido nos
+    próprios caches (o tamanho real do que os tickers aquecidos ocupam neles): o ciclo
+    para ao atingi-lo e, se ainda assim ele for ultrapassado, os itens dos tickers
+    aquecidos menos pedidos são descartados.
+    """
+
+    def __init__(self, top_n=TOP_N, intervalo_segundos=INTERVALO_SEGUNDOS,
+                 limite_concorrencia=LIMITE_CONCORRENCIA, orcamento_memoria_mb=ORCAMENTO_MEMORIA_MB):
+        self.top_n = top_n
+        self.intervalo_segundos = intervalo_segundos
+        self.limite_concorrencia = limite_concorrencia
+        self.orcamento_bytes = orcamento_memoria_mb * 1024 * 1024
+        self.frequencia = Counter()
+        self.bytes_aquecidos = 0
+        self._trava = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def registrar_acesso(self, ticker):
+        with self._trava:
+            self.frequencia[ticker.upper()] += 1
+
+    def mais_pedidos(self):
+        with self._trava:
+            return [ticker for ticker, _ in self.frequencia.most_common(self.top_n)]
+
+    @staticmethod
+    def _bytes_em_cache(tickers):
+        """
+        Memória que os itens pré-aquecidos desses tickers ocupam nos caches de figuras e de preços.
+        """
+        tickers = set(tickers)
+        return (graficos.montar_figuras_pvp.bytes_de(lambda ticker, janela_anos=5: ticker in tickers and janela_anos in JANELAS_PREAQUECIDAS)
+                + consultas.baixar_precos.bytes_de(lambda ticker, *_: ticker in tickers))
+
+    def _aquecer_ticker(self, ticker):
+        """
+        Aquece as figuras (e, com elas, os dados) de um ticker, renovando antes os itens
+        que expirariam antes do próximo ciclo.
+        """
+        antecedencia = self.intervalo_segundos + MARGEM_RENOVACAO_SEGUNDOS
+        consultas.baixar_precos.invalidar(lambda ticker_chave, *_: ticker_chave == ticker, expirando_em=antecedencia)
+        graficos.montar_figuras_pvp.invalidar(lambda ticker_chave, janela_anos=5: ticker_chave == ticker and janela_anos in JANELAS_PREAQUECIDAS,
+                                              expirando_em=antecedencia)
+        for janela_anos in JANELAS_PREAQUECIDAS:
+            try:
+                graficos.montar_figuras_pvp(ticker, janela_anos)
+            except consultas.ErroConsulta:
+                continue
+
+    def _descartar(self, ticker):
+        graficos.montar_figuras_pvp.invalidar(lambda ticker_chave, janela_anos=5: ticker_chave == ticker and janela_anos in JANELAS_PREAQUECIDAS)
+        consultas.baixar_precos.invalidar(lambda ticker_chave, *_: ticker_chave == ticker)
+
+    def executar_ciclo(self):
+        """
+        Aquece os tickers mais pedidos, em ordem de popularidade, até esgotar o orçamento de memória.
+        """
+        aquecidos = []
+        with ThreadPoolExecutor(max_workers=self.limite_concorrencia, thread_name_prefix='preaquecimento') as executor:
+            # Os lotes têm o tamanho do limite de concorrência para checar o orçamento entre eles
+            tickers = self.mais_pedidos()
+            for inicio in range(0, len(tickers), self.limite_concorrencia):
+                if self._bytes_em_cache(aquecidos) >= self.orcamento_bytes:
+                    break
+                lote = tickers[inicio:inicio + self.limite_concorrencia]
+                list(executor.map(self._aquecer_ticker, lote))
+                aquecidos += lote
+        # O último lote pode ter passado do orçamento: saem primeiro os menos pedidos
+        while len(aquecidos) > 1 and self._bytes_em_cache(aquecidos) > self.orcamento_bytes:
+            self._descartar(aquecidos.pop())
+        self.bytes_aquecidos = self._bytes_em_cache(aquecidos)
+
+    def _laco(self):
+        while not self._parar.wait(self.intervalo_segundos):
+            try:
+                self.executar_ciclo()
+            except Exception as e:
+                print(f"Falha no pré-aquecimento do cache: {e}")
+
+    def iniciar(self):
+        with self._trava:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._laco, name='preaquecedor', daemon=True)
+                self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+_preaquecedor = None
+_trava_preaquecedor = threading.Lock()
+
+def obter_preaquecedor():
+    """
+    Retorna o pré-aquecedor único do processo, iniciando-o na primeira chamada.
+    """
+    global _preaquecedor
+    with _trava_preaquecedor:
+        if _preaquecedor is None:
+            _preaquecedor = PreAquecedor()
+            _preaquecedor.iniciar()
+    return _preaquecedor
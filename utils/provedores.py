@@ -0,0 +1,318 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- PROVEDORES DE COTAÇÕES (Yahoo Finance, espelho local em arquivos e reprodução para testes) ---
+# Todos devolvem o mesmo formato: um DataFrame largo com índice 'data' (datetime64 sem fuso,
+# à meia-noite), uma coluna float64 por ticker (sem o sufixo '.SA') e linhas em ordem de data.
+# Os fechamentos não são ajustados por proventos; os proventos (valor por cota, na data-ex)
+# vêm à parte, por baixar_proventos, e são usados para montar a série de retorno total.
+# O provedor usado pelo app e pelo pipeline vem da variável de ambiente PROVEDOR_PRECOS:
+#   yahoo    (padrão) Yahoo Finance, recorrendo ao espelho local se ele existir e o Yahoo falhar
+#   arquivos somente o espelho local (PASTA_ESPELHO_PRECOS), para rodar sem rede
+#   replay   respostas gravadas antes por ProvedorReplay, para testes reprodutíveis
+PASTA_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_ESPELHO_PADRAO = os.path.join(PASTA_PROJETO, 'database', 'espelho_precos')
+PASTA_REPLAY_PADRAO = os.path.join(PASTA_PROJETO, 'database', 'replay_precos')
+# tipo de dado: coluna do valor nos arquivos do espelho local
+COLUNAS_ESPELHO = {'fechamentos': 'preco_fechamento', 'proventos': 'provento'}
+
+class ErroProvedor(Exception):
+    """O provedor não conseguiu entregar as cotações pedidas."""
+
+class LimitadorTaxa:
+    """
+    Garante um intervalo mínimo entre o início de requisições consecutivas (seguro entre threads).
+    """
+
+    def __init__(self, requisicoes_por_segundo=None):
+        self.intervalo = 1 / requisicoes_por_segundo if requisicoes_por_segundo else 0
+        self._proxima = 0.0
+        self._trava = threading.Lock()
+
+    def aguardar(self):
+        if not self.intervalo:
+            return
+        with self._trava:
+            agora = time.monotonic()
+            espera = self._proxima - agora
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+def normalizar_fechamentos(df_bruto):
+    """
+    Converte uma tabela larga de fechamentos (índice de datas, uma coluna por ticker)
+    para o formato comum a todos os provedores.
+    """
+    import pandas as pd
+    df = df_bruto.copy()
+    indice = pd.to_datetime(df.index)
+    if indice.tz is not None:
+        indice = indice.tz_localize(None)
+    df.index = indice.normalize().rename('data')
+    df.columns = pd.Index([str(coluna).strip().upper().removesuffix('.SA') for coluna in df.columns], name='ticker')
+    df = df.apply(pd.to_numeric, errors='coerce').astype('float64')
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    return df.dropna(how='all').sort_index(axis=1)
+
+class ProvedorPrecos:
+    """
+    Base dos provedores. As subclasses implementam _baixar_lote; a base divide os pedidos
+    em lotes, executa-os em paralelo até o limite de concorrência, respeita o limite de
+    requisições por segundo e normaliza o resultado.
+    O limite de concorrência vale para o processo todo (páginas, pré-aquecimento e API).
+    """
+    nome = 'base'
+
+    def __init__(self, tamanho_lote=50, max_concorrencia=4, requisicoes_por_segundo=None):
+        self.tamanho_lote = tamanho_lote
+        self.max_concorrencia = max_concorrencia
+        self.limitador = LimitadorTaxa(requisicoes_por_segundo)
+        self._semaforo = threading.BoundedSemaphore(max_concorrencia)
+
+    def _baixar_lote(self, tickers, data_inicial, data_final):
+        raise NotImplementedError
+
+    def _baixar_lote_proventos(self, tickers, data_inicial, data_final):
+        raise ErroProvedor("este provedor não fornece proventos.")
+
+    def _executar_lote(self, tickers, data_inicial, data_final, tipo='fechamentos'):
+        funcao = self._baixar_lote if tipo == 'fechamentos' else self._baixar_lote_proventos
+        with self._semaforo:
+            self.limitador.aguardar()
+            return funcao(tickers, data_inicial, data_final)
+
+    def baixar_fechamentos(self, tickers, data_inicial, data_final=None):
+        """
+        Baixa os fechamentos de vários tickers entre data_inicial (inclusive) e
+        data_final (exclusive; None = até hoje). Tickers sem cotação ficam sem coluna.
+        Levanta ErroProvedor se nenhum lote puder ser obtido.
+        """
+        return self._baixar_em_lotes('fechamentos', tickers, data_inicial, data_final)
+
+    def baixar_proventos(self, tickers, data_inicial, data_final=None):
+        """
+        Baixa os proventos por cota de vários tickers no período, no mesmo formato largo
+        dos fechamentos, com uma linha por data-ex. Dias sem provento ficam vazios.
+        Levanta ErroProvedor se nenhum lote puder ser obtido.
+        """
+        df = self._baixar_em_lotes('proventos', tickers, data_inicial, data_final)
+        df = df.where(df > 0)
+        return df.dropna(how='all')
+
+    def _baixar_em_lotes(self, tipo, tickers, data_inicial, data_final):
+        import pandas as pd
+        tickers = [ticker.upper() for ticker in tickers]
+        lotes = [tickers[inicio:inicio + self.tamanho_lote] for inicio in range(0, len(tickers), self.tamanho_lote)]
+
+        def baixar(lote):
+            try:
+                return normalizar_fechamentos(self._executar_lote(lote, data_inicial, data_final, tipo))
+            except Exception as e:
+                return ErroProvedor(f"{self.nome}: falha ao baixar {tipo} de {len(lote)} ticker(s) a partir de {lote[0]}. Detalhe: {e}")
+
+        if len(lotes) == 1:
+            resultados = [baixar(lotes[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_concorrencia, thread_name_prefix=f'provedor-{self.nome}') as executor:
+                resultados = list(executor.map(baixar, lotes))
+
+        falhas = [resultado for resultado in resultados if isinstance(resultado, ErroProvedor)]
+        partes = [resultado for resultado in resultados if not isinstance(resultado, ErroProvedor)]
+        if not partes:
+            raise falhas[0] if falhas else ErroProvedor(f"{self.nome}: nenhum ticker pedido.")
+        # Uma falha parcial não interrompe o pedido: os tickers do lote perdido só ficam sem coluna
+        for falha in falhas:
+            print(falha)
+        df = pd.concat(partes, axis=1) if len(partes) > 1 else partes[0]
+        return df.sort_index().sort_index(axis=1)
+
+    def baixar_fechamento(self, ticker, data_inicial, data_final=None):
+        """
+        Atalho para um único ticker: retorna a Series de fechamentos (índice 'data').
+        Levanta ErroProvedor se não houver cotações no período.
+        """
+        df = self.baixar_fechamentos([ticker], data_inicial, data_final)
+        serie = df[ticker.upper()].dropna() if ticker.upper() in df.columns else None
+        if serie is None or serie.empty:
+            raise ErroProvedor(f"{self.nome}: nenhuma cotação de {ticker.upper()} no período pedido.")
+        return serie.rename('preco_fechamento')
+
+class ProvedorYahoo(ProvedorPrecos):
+    nome = 'yahoo'
+
+    def __init__(self, timeout_segundos=20, **kwargs):
+        kwargs.setdefault('requisicoes_por_segundo', 2)
+        super().__init__(**kwargs)
+        self.timeout_segundos = timeout_segundos
+
+    def _baixar(self, tickers, data_inicial, data_final, coluna, **opcoes):
+        import yfinance as yf
+        # auto_adjust=False: o 'Close' ajustado já embutiria os proventos, o que distorceria o P/VP
+        df = yf.download([f"{ticker}.SA" for ticker in tickers], start=data_inicial, end=data_final, auto_adjust=False,
+                         progress=False, threads=True, timeout=self.timeout_segundos, **opcoes)
+        if df is None or df.empty:
+            raise ErroProvedor("o Yahoo Finance não retornou cotações.")
+        valores = df[coluna]
+        # Versões antigas do yfinance devolvem uma Series quando há um único ticker
+        return valores.to_frame(tickers[0]) if valores.ndim == 1 else valores
+
+    def _baixar_lote(self, tickers, data_inicial, data_final):
+        return self._baixar(tickers, data_inicial, data_final, 'Close')
+
+    def _baixar_lote_proventos(self, tickers, data_inicial, data_final):
+        return self._baixar(tickers, data_inicial, data_final, 'Dividends', actions=True)
+
+class ProvedorArquivos(ProvedorPrecos):
+    """
+    Espelho local: um CSV por ticker (<pasta>/<TICKER>.csv, colunas data e preco_fechamento)
+    e, para os proventos, <pasta>/proventos/<TICKER>.csv, com as colunas data e provento.
+    """
+    nome = 'arquivos'
+
+    def __init__(self, pasta=PASTA_ESPELHO_PADRAO, **kwargs):
+        kwargs.setdefault('max_concorrencia', 8)
+        super().__init__(**kwargs)
+        self.pasta = pasta
+
+    def _pasta_tipo(self, tipo):
+        return self.pasta if tipo == 'fechamentos' else os.path.join(self.pasta, tipo)
+
+    def _ler(self, tipo, tickers, data_inicial, data_final):
+        import pandas as pd
+        pasta, coluna = self._pasta_tipo(tipo), COLUNAS_ESPELHO[tipo]
+        series = {}
+        for ticker in tickers:
+            caminho = os.path.join(pasta, f'{ticker}.csv')
+            if os.path.exists(caminho):
+                df = pd.read_csv(caminho, parse_dates=['data'], index_col='data')
+                series[ticker] = df[coluna]
+        if not series:
+            raise ErroProvedor(f"nenhum dos tickers está no espelho local '{pasta}'.")
+        df = pd.DataFrame(series)
+        filtro = df.index >= pd.Timestamp(data_inicial)
+        if data_final is not None:
+            filtro &= df.index < pd.Timestamp(data_final)
+        return df[filtro]
+
+    def _baixar_lote(self, tickers, data_inicial, data_final):
+        return self._ler('fechamentos', tickers, data_inicial, data_final)
+
+    def _baixar_lote_proventos(self, tickers, data_inicial, data_final):
+        return self._ler('proventos', tickers, data_inicial, data_final)
+
+    def gravar(self, df_valores, tipo='fechamentos'):
+        """
+        Incorpora ao espelho os fechamentos (ou proventos) dados, no formato normalizado,
+        preservando o histórico já gravado fora do período recebido.
+        """
+        import pandas as pd
+        pasta, coluna = self._pasta_tipo(tipo), COLUNAS_ESPELHO[tipo]
+        os.makedirs(pasta, exist_ok=True)
+        for ticker in df_valores.columns:
+            serie = df_valores[ticker].dropna().rename(coluna)
+            caminho = os.path.join(pasta, f'{ticker}.csv')
+            if os.path.exists(caminho):
+                existente = pd.read_csv(caminho, parse_dates=['data'], index_col='data')[coluna]
+                serie = pd.concat([existente, serie])
+                serie = serie[~serie.index.duplicated(keep='last')].sort_index()
+            serie.rename_axis('data').to_csv(caminho, date_format='%Y-%m-%d')
+
+class ProvedorReplay(ProvedorPrecos):
+    """
+    Grava as respostas do provedor de origem (quando dado) ou as reproduz depois, sem rede.
+    Cada lote é identificado pelos tickers e pelo período pedidos.
+    """
+    nome = 'replay'
+
+    def __init__(self, pasta=PASTA_REPLAY_PADRAO, origem=None, **kwargs):
+        super().__init__(**kwargs)
+        self.pasta = pasta
+        self.origem = origem
+
+    def _caminho(self, tipo, tickers, data_inicial, data_final):
+        chave = repr((tipo, sorted(tickers), str(data_inicial), str(data_final))).encode('utf-8')
+        return os.path.join(self.pasta, hashlib.sha1(chave).hexdigest() + '.pkl')
+
+    def _baixar_lote(self, tickers, data_inicial, data_final):
+        return self._reproduzir('fechamentos', tickers, data_inicial, data_final)
+
+    def _baixar_lote_proventos(self, tickers, data_inicial, data_final):
+        return self._reproduzir('proventos', tickers, data_inicial, data_final)
+
+    def _reproduzir(self, tipo, tickers, data_inicial, data_final):
+        caminho = self._caminho(tipo, tickers, data_inicial, data_final)
+        if self.origem is not None:
+            df = self.origem._executar_lote(tickers, data_inicial, data_final, tipo)
+            os.makedirs(self.pasta, exist_ok=True)
+            with open(caminho, 'wb') as arquivo:
+                pickle.dump(df, arquivo)
+            return df
+        if not os.path.exists(caminho):
+            raise ErroProvedor(f"não há resposta gravada ({tipo}) para {tickers} de {data_inicial} a {data_final}.")
+        with open(caminho, 'rb') as arquivo:
+            return pickle.load(arquivo)
+
+class ProvedorComReserva(ProvedorPrecos):
+    """
+    Usa o provedor principal e, se ele falhar (fora do ar, lento além do timeout),
+    recorre ao de reserva, normalmente o espelho local.
+    """
+
+    def __init__(self, principal, reserva):
+        super().__init__(tamanho_lote=principal.tamanho_lote, max_concorrencia=principal.max_concorrencia)
+        self.principal = principal
+        self.reserva = reserva
+        self.nome = f'{principal.nome}+{reserva.nome}'
+
+    def _baixar_em_lotes(self, tipo, tickers, data_inicial, data_final):
+        try:
+            return self.principal._baixar_em_lotes(tipo, tickers, data_inicial, data_final)
+        except ErroProvedor as e:
+            print(f"{e} Usando o provedor de reserva '{self.reserva.nome}'.")
+            return self.reserva._baixar_em_lotes(tipo, tickers, data_inicial, data_final)
+
+def criar_provedor_padrao():
+    """
+    Monta o provedor indicado pelas variáveis de ambiente (ver o início do módulo).
+    """
+    tipo = os.environ.get('PROVEDOR_PRECOS', 'yahoo')
+    pasta_espelho = os.environ.get('PASTA_ESPELHO_PRECOS', PASTA_ESPELHO_PADRAO)
+    if tipo == 'arquivos':
+        return ProvedorArquivos(pasta_espelho)
+    if tipo == 'replay':
+        return ProvedorReplay(os.environ.get('PASTA_REPLAY_PRECOS', PASTA_REPLAY_PADRAO))
+    if tipo != 'yahoo':
+        raise ValueError(f"PROVEDOR_PRECOS desconhecido: '{tipo}'.")
+    yahoo = ProvedorYahoo(
+        max_concorrencia=int(os.environ.get('CONCORRENCIA_PRECOS', 4)),
+        requisicoes_por_segundo=float(os.environ.get('REQUISICOES_POR_SEGUNDO_PRECOS', 2)),
+    )
+    if os.path.isdir(pasta_espelho):
+        return ProvedorComReserva(yahoo, ProvedorArquivos(pasta_espelho))
+    return yahoo
+
+_provedor = None
+_trava_provedor = threading.Lock()
+
+def obter_provedor():
+    """
+    Retorna o provedor do processo, criando-o na primeira chamada.
+    """
+    global _provedor
+    with _trava_provedor:
+        if _provedor is None:
+            _provedor = criar_provedor_padrao()
+    return _provedor
+
+def definir_provedor(provedor):
+    """
+    Troca o provedor do processo (testes, teste de carga, scripts com espelho próprio).
+    """
+    global _provedor
+    with _trava_provedor:
+        _provedor = provedor
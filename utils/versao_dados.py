@@ -0,0 +1,82 @@
+import hashlib
+import json
+from datetime import datetime
+
+import pandas as pd
+
+# --- REGISTRO DE VERSÃO DOS DADOS (gravado pelos scripts do pipeline, lido pelo app) ---
+# versao_dados:         uma linha por atualização, com o hash do conteúdo e as chaves alteradas
+# versao_dados_grupos:  o hash atual de cada chave (CNPJ ou ticker), para detectar o que mudou
+TABELA_VERSAO = 'versao_dados'
+TABELA_GRUPOS = 'versao_dados_grupos'
+
+def calcular_hashes_por_grupo(df, coluna_grupo, colunas):
+    """
+    Retorna uma Series {grupo: hash hexadecimal} do conteúdo das colunas dadas em cada grupo.
+    """
+    if df.empty:
+        return pd.Series(dtype=str)
+    df_ordenado = df.sort_values([coluna_grupo] + [c for c in colunas if c != coluna_grupo])
+    df_conteudo = df_ordenado[colunas].copy()
+    # Datas viram texto para que o hash não dependa da resolução do datetime64 lido
+    for coluna in df_conteudo.select_dtypes(include='datetime').columns:
+        df_conteudo[coluna] = df_conteudo[coluna].dt.strftime('%Y-%m-%d')
+    hashes_linhas = pd.util.hash_pandas_object(df_conteudo, index=False)
+    # A posição da linha entra no hash para que a soma dependa da ordem
+    posicao = df_ordenado.groupby(coluna_grupo).cumcount().to_numpy().astype('uint64')
+    combinados = pd.Series(hashes_linhas.to_numpy() ^ (posicao * 0x9E3779B97F4A7C15), index=df_ordenado[coluna_grupo].to_numpy())
+    somas = combinados.groupby(level=0).sum()
+    return somas.map(lambda valor: f'{int(valor):016x}')
+
+def criar_tabelas(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABELA_VERSAO} (
+            versao INTEGER PRIMARY KEY AUTOINCREMENT,
+            escopo TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            gerado_em TEXT NOT NULL,
+            alterados TEXT NOT NULL
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABELA_GRUPOS} (
+            escopo TEXT NOT NULL,
+            grupo TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (escopo, grupo)
+        )
+    """)
+
+def registrar_versao(conn, escopo, hashes, parcial=False):
+    """
+    Compara os hashes por grupo com os da versão anterior e, se algo mudou, grava uma nova
+    linha em versao_dados com o hash geral e a lista de grupos alterados.
+    Com parcial=True, os grupos ausentes em 'hashes' são considerados inalterados
+    (atualizações incrementais); caso contrário, são considerados removidos.
+    Retorna a lista de grupos alterados. Não faz commit.
+    """
+    criar_tabelas(conn)
+    anteriores = dict(conn.execute(f"SELECT grupo, hash FROM {TABELA_GRUPOS} WHERE escopo = ?", (escopo,)).fetchall())
+    atuais = {str(grupo): valor for grupo, valor in hashes.items()}
+
+    alterados = {grupo for grupo, valor in atuais.items() if anteriores.get(grupo) != valor}
+    if not parcial:
+        alterados |= set(anteriores) - set(atuais)
+    if not alterados:
+        print(f"Versão dos dados ({escopo}): nenhuma alteração.")
+        return []
+
+    if not parcial:
+        conn.execute(f"DELETE FROM {TABELA_GRUPOS} WHERE escopo = ?", (escopo,))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {TABELA_GRUPOS} (escopo, grupo, hash) VALUES (?, ?, ?)",
+        [(escopo, grupo, valor) for grupo, valor in atuais.items()]
+    )
+    todos = dict(conn.execute(f"SELECT grupo, hash FROM {TABELA_GRUPOS} WHERE escopo = ?", (escopo,)).fetchall())
+    hash_geral = hashlib.sha1(json.dumps(sorted(todos.items())).encode('utf-8')).hexdigest()
+    conn.execute(
+        f"INSERT INTO {TABELA_VERSAO} (escopo, hash, gerado_em, alterados) VALUES (?, ?, ?, ?)",
+        (escopo, hash_geral, datetime.now().isoformat(timespec='seconds'), json.dumps(sorted(alterados)))
+    )
+    print(f"Versão dos dados ({escopo}): {len(alterados)} grupo(s) alterado(s).")
+    return sorted(alterados)